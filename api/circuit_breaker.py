@@ -0,0 +1,153 @@
+"""
+Circuit breaker для внешней зависимости (OpenAI)
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+from config import (
+    OPENAI_BREAKER_FAILURE_RATE, OPENAI_BREAKER_MIN_REQUESTS, OPENAI_BREAKER_WINDOW_SECONDS,
+    OPENAI_BREAKER_OPEN_SECONDS
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    Три состояния: closed -> open -> half_open -> closed/open
+    
+    closed: запросы идут, результаты копятся в скользящем окне window_seconds;
+    если запросов в окне не меньше min_requests и доля сбоев не меньше
+    failure_rate, breaker открывается. open: запросы сразу отклоняются в течение
+    open_seconds. half_open: пропускается probes пробных запросов; успех закрывает
+    breaker, сбой снова открывает его.
+    
+    Сбой - недоступность сервиса (таймаут, обрыв соединения, 5xx); остальные
+    исходы (например 429) в окно не попадают.
+    
+    Каждая смена состояния начинает новое поколение. allow() возвращает номер
+    поколения как разрешение, и record() учитывает результат, только если
+    разрешение выдано в текущем поколении: ответы запросов, начатых до открытия,
+    не считаются результатом пробного запроса.
+    """
+    
+    def __init__(self, failure_rate: float = OPENAI_BREAKER_FAILURE_RATE,
+                 min_requests: int = OPENAI_BREAKER_MIN_REQUESTS,
+                 window_seconds: float = OPENAI_BREAKER_WINDOW_SECONDS,
+                 open_seconds: float = OPENAI_BREAKER_OPEN_SECONDS, probes: int = 1):
+        self.failure_rate = failure_rate
+        self.min_requests = max(1, min_requests)
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.probes = max(1, probes)
+        self.state = CLOSED
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._generation = 1
+        self._probes_in_flight = 0
+        self._window: "deque[tuple]" = deque()
+        self._failures = 0
+        self._lock = threading.Lock()
+    
+    def allow(self) -> Optional[int]:
+        """
+        Разрешение на запрос
+        
+        В half_open разрешение занимает пробный слот - после запроса обязателен record.
+        
+        Returns:
+            Поколение breaker (передается в record) или None, если запрос отклонен
+        """
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._generation += 1
+                self._probes_in_flight = 0
+            if self.state == CLOSED:
+                return self._generation
+            if self.state == HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                return self._generation
+            self.rejected += 1
+            return None
+    
+    def closed_permit(self) -> Optional[int]:
+        """Разрешение на дополнительный запрос (дубль): только в closed, без учета отказов"""
+        with self._lock:
+            return self._generation if self.state == CLOSED else None
+    
+    def record(self, outcome: str, permit: Optional[int]) -> None:
+        """
+        Результат запроса
+        
+        Args:
+            outcome: ok - ответ получен, failure - сервис недоступен, neutral - прочие ошибки
+            permit: Результат allow или closed_permit для этого запроса
+        """
+        now = time.monotonic()
+        with self._lock:
+            if permit != self._generation:
+                # Разрешение выдано до смены состояния (например, запрос начат до открытия) -
+                # результат устарел и на состояние не влияет
+                return
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if outcome == "ok":
+                    self.state = CLOSED
+                    self._generation += 1
+                    self._window.clear()
+                    self._failures = 0
+                elif outcome == "failure":
+                    self._open(now)
+                return
+            if outcome == "neutral":
+                return
+            
+            failed = outcome == "failure"
+            self._window.append((now, failed))
+            self._failures += failed
+            self._trim(now)
+            if (len(self._window) >= self.min_requests
+                    and self._failures >= self.failure_rate * len(self._window)):
+                self._open(now)
+    
+    def retry_after(self) -> float:
+        """Через сколько секунд имеет смысл снова обращаться к сервису (0 - можно сейчас)"""
+        with self._lock:
+            if self.state == OPEN:
+                return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+            if self.state == HALF_OPEN and self._probes_in_flight >= self.probes:
+                # Ждем результата пробного запроса
+                return min(5.0, self.open_seconds)
+            return 0.0
+    
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self._generation += 1
+        self._opened_at = now
+        self.opened += 1
+        print(f"⚠️ Circuit breaker открыт на {self.open_seconds:.0f} с: OpenAI недоступен")
+    
+    def _trim(self, now: float) -> None:
+        while self._window and now - self._window[0][0] > self.window_seconds:
+            _, failed = self._window.popleft()
+            self._failures -= failed
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Состояние breaker для /metrics"""
+        retry_after = self.retry_after()
+        with self._lock:
+            self._trim(time.monotonic())
+            requests = len(self._window)
+            return {
+                "state": self.state,
+                "window_requests": requests,
+                "failure_rate": round(self._failures / requests, 3) if requests else 0.0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "retry_after_seconds": round(retry_after, 1)
+            }
@@ -0,0 +1,99 @@
+"""
+Адаптивное ограничение числа одновременных запросов (AIMD)
+"""
+
+import time
+import threading
+from typing import Dict, Any, Optional
+from config import (
+    OPENAI_CONCURRENCY, OPENAI_MIN_CONCURRENCY, OPENAI_MAX_CONCURRENCY, OPENAI_LATENCY_TARGET_SECONDS
+)
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Лимит одновременных запросов, подстраивающийся под ответы сервера
+    
+    Additive increase: пока запросы проходят быстрее latency_target и лимит
+    действительно используется, он растет примерно на 1 за каждые limit
+    успешных ответов. Multiplicative decrease: на 429, таймаут или ответ
+    медленнее latency_target лимит умножается на backoff. Запросы, начатые до
+    последнего снижения, лимит повторно не снижают - одна волна 429 дает одно
+    снижение.
+    """
+    
+    def __init__(self, initial: float = OPENAI_CONCURRENCY, min_limit: float = OPENAI_MIN_CONCURRENCY,
+                 max_limit: float = OPENAI_MAX_CONCURRENCY, latency_target: float = OPENAI_LATENCY_TARGET_SECONDS,
+                 backoff: float = 0.5):
+        self.min_limit = max(1.0, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.increases = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+    
+    def acquire(self, deadline: Optional[float] = None) -> Optional[float]:
+        """
+        Ожидание свободного слота
+        
+        Args:
+            deadline: Крайний срок по time.monotonic() (None - ждать сколько нужно)
+        
+        Returns:
+            Время начала запроса (передается в release) или None, если до deadline слот не освободился
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    return None
+                self._condition.wait(timeout)
+            self.in_flight += 1
+            return time.monotonic()
+    
+    def release(self, started: float, outcome: str) -> None:
+        """
+        Освобождение слота и подстройка лимита по результату запроса
+        
+        Args:
+            started: Результат acquire
+            outcome: ok - ответ получен, throttled - 429 или таймаут, error - прочие ошибки,
+                cancelled - запрос не отправлялся
+        """
+        now = time.monotonic()
+        latency = now - started
+        with self._condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            
+            if outcome == "ok":
+                self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            
+            congested = outcome == "throttled" or (outcome == "ok" and latency > self.latency_target)
+            if congested:
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+                    self.decreases += 1
+            elif outcome == "ok" and saturated and self.limit < self.max_limit:
+                previous = int(self.limit)
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                if int(self.limit) > previous:
+                    self.increases += 1
+            
+            self._condition.notify_all()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Текущий лимит и наблюдаемая задержка для /metrics"""
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "latency_ewma_ms": round(self.latency_ewma * 1000) if self.latency_ewma is not None else None,
+                "increases": self.increases,
+                "decreases": self.decreases
+            }
@@ -10,6 +10,34 @@ from typing import List
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o")
 OPENAI_TIMEOUT = 90.0
+OPENAI_CONCURRENCY = int(os.environ.get("OPENAI_CONCURRENCY", "4"))  # Параллельные запросы в рамках одного файла
+OPENAI_MAX_ATTEMPTS = int(os.environ.get("OPENAI_MAX_ATTEMPTS", "4"))  # Попыток на запрос при 429/5xx/таймаутах
+OPENAI_BACKOFF_BASE_SECONDS = float(os.environ.get("OPENAI_BACKOFF_BASE_SECONDS", "1"))
+OPENAI_BACKOFF_MAX_SECONDS = float(os.environ.get("OPENAI_BACKOFF_MAX_SECONDS", "30"))
+OPENAI_RPM = float(os.environ.get("OPENAI_RPM", "0"))  # Лимит запросов в минуту аккаунта (0 - без лимита)
+OPENAI_TPM = float(os.environ.get("OPENAI_TPM", "0"))  # Лимит токенов в минуту аккаунта (0 - без лимита)
+OPENAI_TOKENS_ESTIMATE = float(os.environ.get("OPENAI_TOKENS_ESTIMATE", "2000"))  # Начальная оценка токенов на запрос
+OPENAI_ADAPTIVE_CONCURRENCY = os.environ.get("OPENAI_ADAPTIVE_CONCURRENCY", "true").lower() in ("1", "true", "yes")
+OPENAI_MIN_CONCURRENCY = int(os.environ.get("OPENAI_MIN_CONCURRENCY", "1"))  # Границы адаптивного лимита (на процесс)
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_LATENCY_TARGET_SECONDS = float(os.environ.get("OPENAI_LATENCY_TARGET_SECONDS", "45"))  # Медленнее - лимит снижается
+OPENAI_HEDGE_ENABLED = os.environ.get("OPENAI_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+OPENAI_HEDGE_PERCENTILE = float(os.environ.get("OPENAI_HEDGE_PERCENTILE", "95"))  # Дубль запроса после этой перцентили задержки
+OPENAI_HEDGE_DELAY_SECONDS = float(os.environ.get("OPENAI_HEDGE_DELAY_SECONDS", "30"))  # Задержка дубля, пока нет статистики
+OPENAI_HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("OPENAI_HEDGE_MIN_DELAY_SECONDS", "2"))
+OPENAI_HEDGE_BUDGET = float(os.environ.get("OPENAI_HEDGE_BUDGET", "0.2"))  # Доля дополнительных запросов на задачу
+OPENAI_BREAKER_ENABLED = os.environ.get("OPENAI_BREAKER_ENABLED", "true").lower() in ("1", "true", "yes")
+OPENAI_BREAKER_FAILURE_RATE = float(os.environ.get("OPENAI_BREAKER_FAILURE_RATE", "0.5"))  # Доля сбоев, открывающая breaker
+OPENAI_BREAKER_MIN_REQUESTS = int(os.environ.get("OPENAI_BREAKER_MIN_REQUESTS", "10"))  # Минимум запросов в окне
+OPENAI_BREAKER_WINDOW_SECONDS = float(os.environ.get("OPENAI_BREAKER_WINDOW_SECONDS", "60"))
+OPENAI_BREAKER_OPEN_SECONDS = float(os.environ.get("OPENAI_BREAKER_OPEN_SECONDS", "30"))  # Пауза перед пробным запросом
+
+# Кэш ответов web search
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_PATH = os.environ.get("CACHE_PATH", ".ai_visibility_cache.sqlite")
+CACHE_TTL_HOURS = float(os.environ.get("CACHE_TTL_HOURS", "24"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))
+CACHE_BUSY_TIMEOUT_MS = int(os.environ.get("CACHE_BUSY_TIMEOUT_MS", "1000"))  # Ожидание блокировки записи (дольше - промах)
 
 # Домены для анализа (теперь используются как fallback)
 OUR_DOMAINS: List[str] = [
@@ -21,10 +49,40 @@ OUR_DOMAINS: List[str] = [
 # Файловые ограничения
 ALLOW_RETRY_SAME_FILE = os.environ.get("ALLOW_RETRY_SAME_FILE", "false").lower() in ("1", "true", "yes")
 MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", "10"))
-MAX_ROWS_PROCESS = 10  # Жестко ограничено в MVP
+MAX_DECOMPRESSED_MB = int(os.environ.get("MAX_DECOMPRESSED_MB", "100"))  # Лимит распаковки сжатых загрузок
+MAX_ROWS_PROCESS = int(os.environ.get("MAX_ROWS_PROCESS", "10"))  # 10 в бесплатном MVP, больше на платном тарифе
+FILE_BATCH_SIZE = int(os.environ.get("FILE_BATCH_SIZE", "1000"))  # Строк в блоке при потоковом чтении файла
+XLSX_ENGINE = os.environ.get("XLSX_ENGINE", "auto").lower()  # auto/openpyxl - потоково; calamine - быстрее, лист целиком в памяти
+REPORT_FORMAT = os.environ.get("REPORT_FORMAT", "csv").lower()  # csv | parquet (нужен pyarrow)
+
+# Ограничение частоты загрузок (в памяти процесса, до чтения тела запроса)
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_IP_PER_MINUTE = float(os.environ.get("RATE_LIMIT_IP_PER_MINUTE", "6"))
+RATE_LIMIT_IP_BURST = float(os.environ.get("RATE_LIMIT_IP_BURST", "10"))
+RATE_LIMIT_EMAIL_PER_MINUTE = float(os.environ.get("RATE_LIMIT_EMAIL_PER_MINUTE", "2"))
+RATE_LIMIT_EMAIL_BURST = float(os.environ.get("RATE_LIMIT_EMAIL_BURST", "5"))
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "10000"))  # Ведер в памяти на лимитер (LRU)
+
+# Фоновые задачи
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "20"))
+JOB_DEFAULT_SECONDS = float(os.environ.get("JOB_DEFAULT_SECONDS", "60"))  # Начальная оценка длительности задачи
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "300"))  # Аренда задачи воркером, продлевается во время работы
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "5"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_DEADLINE_SECONDS = float(os.environ.get("JOB_DEADLINE_SECONDS", "900"))  # Общий срок запросов к OpenAI на попытку задачи
+JOB_EVENTS_HISTORY = int(os.environ.get("JOB_EVENTS_HISTORY", "1000"))  # События прогресса на задачу для SSE
+JOB_EVENTS_MAX_JOBS = int(os.environ.get("JOB_EVENTS_MAX_JOBS", "200"))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get("SSE_KEEPALIVE_SECONDS", "15"))
 
 # База данных
 REGISTRY_PATH = os.environ.get("REGISTRY_PATH", ".ai_visibility_gate.sqlite")
+REGISTRY_BUSY_TIMEOUT_MS = int(os.environ.get("REGISTRY_BUSY_TIMEOUT_MS", "5000"))  # Ожидание блокировки записи
+REGISTRY_CACHED_STATEMENTS = int(os.environ.get("REGISTRY_CACHED_STATEMENTS", "128"))  # Кэш подготовленных запросов на соединение
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", ".ai_visibility_uploads")  # Загрузки хранятся до разбора воркером
+STATS_CACHE_SECONDS = float(os.environ.get("STATS_CACHE_SECONDS", "30"))  # TTL кэша ответа /stats
+STATS_DAYS = int(os.environ.get("STATS_DAYS", "30"))  # Дней в разбивке /stats
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")  # Токен доступа к /stats и /metrics (пусто - доступ закрыт)
 
 # SMTP настройки
 SMTP_HOST = os.environ.get("SMTP_HOST")
@@ -42,4 +100,6 @@ def validate_config():
     if not OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY не установлен")
     if not SMTP_HOST or not SMTP_USER or not SMTP_PASS:
-        raise ValueError("SMTP настройки не полные")
\ No newline at end of file
+        raise ValueError("SMTP настройки не полные")
+    if REPORT_FORMAT not in ("csv", "parquet"):
+        raise ValueError(f"Неподдерживаемый REPORT_FORMAT: {REPORT_FORMAT}")
\ No newline at end of file
@@ -3,148 +3,629 @@
 """
 
 import os
+import json
+import time
+import uuid
+import asyncio
 import sqlite3
-from datetime import datetime
-from typing import Optional, Tuple
-from config import REGISTRY_PATH
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Tuple, List, Dict, Any, Callable
+from config import REGISTRY_PATH, REGISTRY_BUSY_TIMEOUT_MS, REGISTRY_CACHED_STATEMENTS, JOB_MAX_ATTEMPTS
+
+# Ключ агрегата в таблице счетчиков: за все дни / по всем странам
+STATS_ALL = "*"
 
 class Database:
     """Класс для работы с SQLite базой данных"""
     
     def __init__(self):
         self.db_path = REGISTRY_PATH
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
         self.init_db()
     
     def connect(self) -> sqlite3.Connection:
-        """Создание подключения к базе данных"""
-        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
-        return sqlite3.connect(self.db_path)
+        """
+        Постоянное подключение к базе данных для текущего потока
+        
+        Соединение открывается один раз на поток и переиспользуется (вместе с кэшем
+        подготовленных запросов). Транзакции оформляются через `with conn:` -
+        commit при успехе и rollback при исключении.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=REGISTRY_BUSY_TIMEOUT_MS / 1000,
+                cached_statements=REGISTRY_CACHED_STATEMENTS
+            )
+            # WAL: читатели не блокируют писателя; NORMAL достаточно для WAL (fsync на checkpoint)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={REGISTRY_BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+    
+    def close(self) -> None:
+        """Закрытие соединения текущего потока"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
     
     def init_db(self):
         """Инициализация базы данных и создание таблиц"""
-        conn = self.connect()
-        cur = conn.cursor()
-        
-        # Таблица для отслеживания IP адресов и обработанных файлов
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS uploads (
-                ip TEXT PRIMARY KEY,
-                file_hash TEXT,
-                first_seen_utc TEXT,
-                last_seen_utc TEXT
-            )
-        """)  # IP может обрабатывать только один файл
-        
-        # Таблица для хранения email адресов
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS emails (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE,
-                ip TEXT,
-                first_seen_utc TEXT,
-                last_sent_utc TEXT
+        with self.connect() as conn:
+            cur = conn.cursor()
+            
+            # Таблица для отслеживания IP адресов и обработанных файлов
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    ip TEXT PRIMARY KEY,
+                    file_hash TEXT,
+                    first_seen_utc TEXT,
+                    last_seen_utc TEXT,
+                    upload_count INTEGER DEFAULT 1
+                )
+            """)  # IP может обрабатывать только один файл
+            self.add_missing_columns(cur, "uploads", {"upload_count": "INTEGER DEFAULT 1"})
+            
+            # Таблица для хранения email адресов
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS emails (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT UNIQUE,
+                    ip TEXT,
+                    first_seen_utc TEXT,
+                    last_sent_utc TEXT,
+                    sent_count INTEGER DEFAULT 1
+                )
+            """)
+            self.add_missing_columns(cur, "emails", {"sent_count": "INTEGER DEFAULT 1"})
+            
+            # Очередь задач на обработку файлов
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    email TEXT,
+                    ip TEXT,
+                    file_path TEXT,
+                    status TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    rows_total INTEGER,
+                    lease_owner TEXT,
+                    lease_expires_ts REAL,
+                    error TEXT,
+                    created_utc TEXT,
+                    updated_utc TEXT,
+                    country TEXT,
+                    rows_done INTEGER
+                )
+            """)  # status: queued | running | done | failed
+            self.add_missing_columns(cur, "jobs", {"country": "TEXT", "rows_done": "INTEGER"})
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_utc)")
+            
+            # Входные строки задач и чекпоинты результатов по строкам
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS job_rows (
+                    job_id TEXT,
+                    row_idx INTEGER,
+                    country TEXT,
+                    prompt TEXT,
+                    website TEXT,
+                    target_domain TEXT,
+                    sources TEXT,
+                    metrics TEXT,
+                    completed_utc TEXT,
+                    PRIMARY KEY (job_id, row_idx)
+                )
+            """)
+            self.add_missing_columns(cur, "job_rows", {
+                "sources": "TEXT",
+                "metrics": "TEXT",
+                "completed_utc": "TEXT"
+            })
+            
+            # Строки завершенных задач, оставшиеся от версий без очистки
+            cur.execute("SELECT id FROM jobs WHERE status IN ('done', 'failed') AND rows_done IS NULL")
+            for (job_id,) in cur.fetchall():
+                self.purge_job_rows(cur, job_id)
+            
+            # Счетчики статистики: обновляются в той же транзакции, что и запись
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stats_counters (
+                    day TEXT,
+                    country TEXT,
+                    metric TEXT,
+                    value INTEGER,
+                    PRIMARY KEY (day, country, metric)
+                )
+            """)  # day/country = STATS_ALL - агрегат
+            
+            # Базы, созданные до появления счетчиков: итоги считаются один раз
+            cur.execute("SELECT COUNT(*) FROM stats_counters")
+            if cur.fetchone()[0] == 0:
+                cur.execute(
+                    "INSERT INTO stats_counters SELECT ?, ?, 'unique_ips', COUNT(*) FROM uploads",
+                    (STATS_ALL, STATS_ALL)
+                )
+                cur.execute(
+                    "INSERT INTO stats_counters SELECT ?, ?, 'unique_emails', COUNT(*) FROM emails",
+                    (STATS_ALL, STATS_ALL)
+                )
+    
+    @staticmethod
+    def add_missing_columns(cur: sqlite3.Cursor, table: str, columns: Dict[str, str]) -> None:
+        """
+        Добавление колонок, появившихся после создания таблицы (миграция существующих баз)
+        
+        Args:
+            cur: Курсор
+            table: Имя таблицы
+            columns: Имя колонки -> SQL тип
+        """
+        cur.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cur.fetchall()}
+        for name, sql_type in columns.items():
+            if name not in existing:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+    
+    @staticmethod
+    def bump_counters(cur: sqlite3.Cursor, country: str, counters: Dict[str, int]) -> None:
+        """
+        Увеличение счетчиков статистики в текущей транзакции
+        
+        Каждый счетчик пишется за день и страну, за день, за страну и в общий итог.
+        
+        Args:
+            cur: Курсор открытой транзакции
+            country: Код страны (пустая строка - неизвестна)
+            counters: Имя счетчика -> приращение (нулевые пропускаются)
+        """
+        day = datetime.utcnow().date().isoformat()
+        country = country or "XX"
+        cur.executemany(
+            "INSERT INTO stats_counters (day, country, metric, value) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(day, country, metric) DO UPDATE SET value = value + excluded.value",
+            [
+                (key_day, key_country, metric, value)
+                for metric, value in counters.items() if value
+                for key_day in (day, STATS_ALL)
+                for key_country in (country, STATS_ALL)
+            ]
+        )
+    
+    @staticmethod
+    def purge_job_rows(cur: sqlite3.Cursor, job_id: str) -> None:
+        """
+        Удаление строк завершенной задачи (входные данные, метрики, источники)
+        
+        Число обработанных строк сохраняется в jobs.rows_done для get_job.
+        
+        Args:
+            cur: Курсор открытой транзакции
+            job_id: Идентификатор задачи в статусе done или failed
+        """
+        cur.execute(
+            "UPDATE jobs SET rows_done = "
+            "(SELECT COUNT(*) FROM job_rows WHERE job_id = ? AND completed_utc IS NOT NULL) WHERE id = ?",
+            (job_id, job_id)
+        )
+        cur.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+    
+    @staticmethod
+    def register_upload(cur: sqlite3.Cursor, ip: str, file_hash: str, allow_retry: bool, country: str) -> None:
+        """
+        Регистрация загрузки в текущей транзакции (см. create_job)
+        
+        Raises:
+            PermissionError: Если этот файл уже обрабатывался с данного IP
+        """
+        now = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+        
+        # Одна атомарная операция: новый IP или другой файл - запись вставляется/обновляется,
+        # тот же файл - обновление отфильтровано WHERE и RETURNING не возвращает строку
+        cur.execute(
+            "INSERT INTO uploads (ip, file_hash, first_seen_utc, last_seen_utc) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(ip) DO UPDATE SET file_hash = excluded.file_hash, last_seen_utc = excluded.last_seen_utc, "
+            "upload_count = uploads.upload_count + 1 "
+            "WHERE uploads.file_hash IS NOT excluded.file_hash OR ? "
+            "RETURNING upload_count",
+            (ip, file_hash, now, now, allow_retry)
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise PermissionError("Этот файл уже был обработан с данного IP адреса")
+        
+        # upload_count = 1 - строка только что вставлена, то есть это новый IP
+        Database.bump_counters(cur, country, {"uploads": 1, "unique_ips": int(row[0] == 1)})
+    
+    def save_email(self, email: str, ip: str, country: str = "") -> None:
+        """
+        Сохранение email адреса в базу
+        
+        Args:
+            email: Email адрес
+            ip: IP адрес пользователя
+            country: Код страны клиента (для статистики)
+        """
+        now = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+        
+        # Новый email вставляется, существующему обновляется время последней отправки
+        with self.connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO emails (email, ip, first_seen_utc, last_sent_utc) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(email) DO UPDATE SET last_sent_utc = excluded.last_sent_utc, ip = excluded.ip, "
+                "sent_count = emails.sent_count + 1 "
+                "RETURNING sent_count",
+                (email, ip, now, now)
             )
-        """)
+            sent_count = cur.fetchone()[0]
+            self.bump_counters(cur, country, {"reports_sent": 1, "unique_emails": int(sent_count == 1)})
+    
+    def get_stats(self) -> Tuple[int, int]:
+        """
+        Получение статистики
         
-        conn.commit()
-        conn.close()
+        Returns:
+            Tuple[количество уникальных IP, количество уникальных email]
+        """
+        totals = self.get_counters(days=0)["totals"]
+        return totals.get("unique_ips", 0), totals.get("unique_emails", 0)
     
-    def check_ip_file_access(self, ip: str, file_hash: str, allow_retry: bool = False) -> None:
+    def get_counters(self, days: int = 30) -> Dict[str, Any]:
         """
-        Проверка доступа IP к обработке файла
+        Счетчики статистики без сканирования таблиц uploads и emails
         
         Args:
-            ip: IP адрес
-            file_hash: Хеш файла
+            days: Сколько последних дней вернуть в разбивке по дням
+            
+        Returns:
+            Dict с totals (итоги), countries (итоги по странам) и days (по дням: итог и страны)
+        """
+        since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat() if days > 0 else None
+        
+        with self.connect() as conn:
+            if since:
+                cur = conn.execute(
+                    "SELECT day, country, metric, value FROM stats_counters WHERE day = ? OR day >= ?",
+                    (STATS_ALL, since)
+                )
+            else:
+                cur = conn.execute(
+                    "SELECT day, country, metric, value FROM stats_counters WHERE day = ?",
+                    (STATS_ALL,)
+                )
+            records = cur.fetchall()
+        
+        result: Dict[str, Any] = {"totals": {}, "countries": {}, "days": {}}
+        for day, country, metric, value in records:
+            if day == STATS_ALL:
+                target = result["totals"] if country == STATS_ALL else result["countries"].setdefault(country, {})
+            else:
+                day_stats = result["days"].setdefault(day, {"totals": {}, "countries": {}})
+                target = day_stats["totals"] if country == STATS_ALL else day_stats["countries"].setdefault(country, {})
+            target[metric] = value
+        return result
+
+    def create_job(self, email: str, ip: str, file_path: str, country: str = "", file_hash: Optional[str] = None,
+                   allow_retry: bool = False, max_queued: Optional[int] = None) -> Optional[str]:
+        """
+        Постановка задачи в очередь
+        
+        Проверка места в очереди, регистрация загрузки (register_upload) и
+        вставка задачи идут в одной транзакции: если задача не поставлена, загрузка
+        не засчитывается и тот же файл можно отправить повторно.
+        
+        Args:
+            email: Email для отправки отчета
+            ip: IP адрес пользователя
+            file_path: Путь к сохраненному файлу загрузки
+            country: Код страны клиента (для статистики)
+            file_hash: Хеш файла для проверки повторной загрузки (None - без проверки)
             allow_retry: Разрешить повторную обработку того же файла
+            max_queued: Максимум задач в статусе queued (None - без ограничения)
+            
+        Returns:
+            Идентификатор задачи или None, если очередь заполнена
             
         Raises:
-            PermissionError: Если доступ запрещен
+            PermissionError: Если этот файл уже обрабатывался с данного IP
         """
-        conn = self.connect()
-        cur = conn.cursor()
-        
+        job_id = uuid.uuid4().hex
         now = datetime.utcnow().isoformat(timespec="seconds") + "Z"
         
-        # Проверяем существующие записи для данного IP
-        cur.execute("SELECT file_hash FROM uploads WHERE ip = ?", (ip,))
-        row = cur.fetchone()
+        with self.connect() as conn:
+            cur = conn.cursor()
+            # BEGIN IMMEDIATE: между подсчетом очереди и вставкой задачу не добавит другой процесс
+            cur.execute("BEGIN IMMEDIATE")
+            
+            if max_queued is not None:
+                cur.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'")
+                if cur.fetchone()[0] >= max_queued:
+                    return None
+            
+            if file_hash is not None:
+                self.register_upload(cur, ip, file_hash, allow_retry, country)
+            
+            cur.execute(
+                "INSERT INTO jobs (id, email, ip, file_path, status, attempts, created_utc, updated_utc, country) "
+                "VALUES (?, ?, ?, ?, 'queued', 0, ?, ?, ?)",
+                (job_id, email, ip, file_path, now, now, country)
+            )
+        
+        return job_id
+    
+    def claim_job(self, worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        Атомарный захват следующей задачи воркером
         
-        if not row:
-            # Первый раз для этого IP - разрешаем и сохраняем
+        Берется самая старая задача в статусе queued или running с истекшей арендой
+        (воркер, который ее выполнял, упал или процесс был перезапущен).
+        
+        Args:
+            worker_id: Идентификатор воркера
+            lease_seconds: Длительность аренды задачи
+            
+        Returns:
+            Dict с полями задачи или None, если очередь пуста
+        """
+        now_ts = time.time()
+        now = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+        job = None
+        
+        with self.connect() as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            
+            # BEGIN IMMEDIATE берет блокировку записи сразу, поэтому два воркера не захватят одну задачу
+            cur.execute("BEGIN IMMEDIATE")
+            
+            # Задачи, исчерпавшие попытки, больше не берем
             cur.execute(
-                "INSERT INTO uploads VALUES (?, ?, ?, ?)",
-                (ip, file_hash, now, now)
+                "UPDATE jobs SET status = 'failed', lease_owner = NULL, updated_utc = ? "
+                "WHERE status = 'running' AND lease_expires_ts < ? AND attempts >= ? RETURNING id, file_path",
+                (now, now_ts, JOB_MAX_ATTEMPTS)
             )
-        else:
-            existing_hash = row[0]
-            if existing_hash == file_hash:
-                if not allow_retry:
-                    conn.close()
-                    raise PermissionError("Этот файл уже был обработан с данного IP адреса")
-                else:
-                    # Обновляем время последнего обращения
-                    cur.execute(
-                        "UPDATE uploads SET last_seen_utc = ? WHERE ip = ?",
-                        (now, ip)
-                    )
-            else:
-                # Разный файл - обновляем запись
+            abandoned = [dict(row) for row in cur.fetchall()]
+            for failed in abandoned:
+                self.purge_job_rows(cur, failed["id"])
+            
+            cur.execute(
+                "SELECT id FROM jobs "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_expires_ts < ?) "
+                "ORDER BY created_utc LIMIT 1",
+                (now_ts,)
+            )
+            row = cur.fetchone()
+            
+            if row:
                 cur.execute(
-                    "UPDATE uploads SET file_hash = ?, last_seen_utc = ? WHERE ip = ?",
-                    (file_hash, now, ip)
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                    "lease_expires_ts = ?, updated_utc = ? WHERE id = ?",
+                    (worker_id, now_ts + lease_seconds, now, row["id"])
                 )
+                cur.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],))
+                job = dict(cur.fetchone())
         
-        conn.commit()
-        conn.close()
+        # Загрузки брошенных задач больше не понадобятся (воркер, который удалил бы их сам, упал)
+        for failed in abandoned:
+            if failed["file_path"] and os.path.exists(failed["file_path"]):
+                os.remove(failed["file_path"])
+        
+        return job
     
-    def save_email(self, email: str, ip: str) -> None:
+    def renew_lease(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
         """
-        Сохранение email адреса в базу
+        Продление аренды задачи
         
-        Args:
-            email: Email адрес
-            ip: IP адрес пользователя
+        Returns:
+            False если задача уже принадлежит другому воркеру
         """
-        conn = self.connect()
-        cur = conn.cursor()
+        with self.connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_expires_ts = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (time.time() + lease_seconds, job_id, worker_id)
+            )
+            return cur.rowcount == 1
+    
+    def finish_job(self, job_id: str, worker_id: str, error: Optional[str] = None, postpone: bool = False,
+                   final: bool = False) -> str:
+        """
+        Завершение задачи воркером
+        
+        При ошибке задача возвращается в очередь, пока не исчерпаны попытки.
+        Строки завершенной (done/failed) задачи удаляются - реестр не растет.
         
+        Args:
+            job_id: Идентификатор задачи
+            worker_id: Идентификатор воркера
+            error: Текст ошибки (None при успехе)
+            postpone: Задача отложена - возвращается в очередь, попытка не засчитывается
+            final: Ошибка неустранима - задача завершается со статусом failed без повторов
+            
+        Returns:
+            Новый статус задачи
+        """
         now = datetime.utcnow().isoformat(timespec="seconds") + "Z"
         
-        # Пытаемся вставить новый email
-        try:
+        with self.connect() as conn:
+            cur = conn.cursor()
+            
+            if error is None:
+                status = "done"
+            elif final:
+                status = "failed"
+            elif postpone:
+                status = "queued"
+            else:
+                cur.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,))
+                row = cur.fetchone()
+                status = "failed" if not row or row[0] >= JOB_MAX_ATTEMPTS else "queued"
+            
             cur.execute(
-                "INSERT INTO emails (email, ip, first_seen_utc, last_sent_utc) VALUES (?, ?, ?, ?)",
-                (email, ip, now, now)
+                "UPDATE jobs SET status = ?, error = ?, attempts = MAX(0, attempts - ?), lease_owner = NULL, "
+                "lease_expires_ts = NULL, updated_utc = ? WHERE id = ? AND lease_owner = ?",
+                (status, error, 1 if postpone else 0, now, job_id, worker_id)
             )
-        except sqlite3.IntegrityError:
-            # Email уже существует - обновляем время последней отправки
+            if cur.rowcount == 1 and status in ("done", "failed"):
+                self.purge_job_rows(cur, job_id)
+        
+        return status
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Статус задачи и прогресс по строкам
+        
+        Returns:
+            Dict с полями задачи и rows_done или None, если задача не найдена
+        """
+        with self.connect() as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
             cur.execute(
-                "UPDATE emails SET last_sent_utc = ?, ip = ? WHERE email = ?",
-                (now, ip, email)
+                "SELECT id, status, attempts, rows_total, error, created_utc, updated_utc, rows_done "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
             )
+            row = cur.fetchone()
+            if not row:
+                return None
+            
+            job = dict(row)
+            if job["rows_done"] is not None:
+                # Задача завершена, ее строки уже удалены
+                return job
+            cur.execute(
+                "SELECT COUNT(*) FROM job_rows WHERE job_id = ? AND completed_utc IS NOT NULL",
+                (job_id,)
+            )
+            job["rows_done"] = cur.fetchone()[0]
         
-        conn.commit()
-        conn.close()
+        return job
     
-    def get_stats(self) -> Tuple[int, int]:
+    def count_jobs(self, status: str) -> int:
+        """Количество задач в указанном статусе"""
+        with self.connect() as conn:
+            cur = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,))
+            return cur.fetchone()[0]
+    
+    def save_job_rows(self, job_id: str, rows: List[Dict[str, Any]], start_idx: int = 0) -> None:
         """
-        Получение статистики
+        Сохранение блока входных строк задачи
+        
+        Уже сохраненные строки (и их чекпоинты) не перезаписываются, поэтому блок
+        можно безопасно сохранить повторно при возобновлении задачи.
+        
+        Args:
+            job_id: Идентификатор задачи
+            rows: Строки с колонками Country, Prompt, Website, target_domain
+            start_idx: Номер первой строки блока в задаче
+        """
+        with self.connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO job_rows (job_id, row_idx, country, prompt, website, target_domain) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, start_idx + i, row['Country'], row['Prompt'], row['Website'], row['target_domain'])
+                    for i, row in enumerate(rows)
+                ]
+            )
+    
+    def set_job_rows_total(self, job_id: str, rows_total: int) -> None:
+        """Отметка о завершении разбора файла: все строки задачи сохранены"""
+        with self.connect() as conn:
+            conn.execute("UPDATE jobs SET rows_total = ? WHERE id = ?", (rows_total, job_id))
+    
+    def get_job_rows(self, job_id: str, start_idx: int = 0, limit: int = -1) -> List[Dict[str, Any]]:
+        """
+        Входные строки задачи в исходном порядке
+        
+        Args:
+            job_id: Идентификатор задачи
+            start_idx: Номер первой строки
+            limit: Максимальное количество строк (-1 - без ограничения)
         
         Returns:
-            Tuple[количество уникальных IP, количество уникальных email]
+            Список строк; у завершенных строк заполнены sources и metrics, у остальных - None
         """
-        conn = self.connect()
-        cur = conn.cursor()
+        with self.connect() as conn:
+            cur = conn.execute(
+                "SELECT row_idx, country, prompt, website, target_domain, sources, metrics "
+                "FROM job_rows WHERE job_id = ? AND row_idx >= ? ORDER BY row_idx LIMIT ?",
+                (job_id, start_idx, limit)
+            )
+            records = cur.fetchall()
         
-        cur.execute("SELECT COUNT(*) FROM uploads")
-        ip_count = cur.fetchone()[0]
+        return [
+            {
+                "row_idx": row_idx,
+                "Country": country,
+                "Prompt": prompt,
+                "Website": website,
+                "target_domain": target_domain,
+                "sources": json.loads(sources) if sources is not None else None,
+                "metrics": json.loads(metrics) if metrics is not None else None
+            }
+            for row_idx, country, prompt, website, target_domain, sources, metrics in records
+        ]
+    
+    def save_row_result(self, job_id: str, row_idx: int, sources: List[Dict[str, Any]],
+                        metrics: Dict[str, Any]) -> None:
+        """
+        Чекпоинт строки: источники и метрики сохраняются сразу после ответа OpenAI
         
-        cur.execute("SELECT COUNT(*) FROM emails")
-        email_count = cur.fetchone()[0]
+        Args:
+            job_id: Идентификатор задачи
+            row_idx: Номер строки в задаче
+            sources: Источники из ответа OpenAI
+            metrics: Рассчитанные метрики
+        """
+        now = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+        with self.connect() as conn:
+            conn.execute(
+                "UPDATE job_rows SET sources = ?, metrics = ?, completed_utc = ? WHERE job_id = ? AND row_idx = ?",
+                (json.dumps(sources, ensure_ascii=False), json.dumps(metrics, ensure_ascii=False), now, job_id, row_idx)
+            )
+
+class AsyncDatabase:
+    """
+    Неблокирующий доступ к реестру для async обработчиков FastAPI
+    
+    Запросы выполняются в выделенном потоке БД, цикл событий только ожидает
+    результат - медленный commit не задерживает остальные запросы.
+    """
+    
+    def __init__(self, database: Database):
+        self.database = database
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="registry-db")
+    
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Выполнение синхронной функции работы с БД в потоке БД
         
-        conn.close()
-        return ip_count, email_count
+        Args:
+            func: Функция (метод Database или другая функция, обращающаяся к БД)
+            
+        Returns:
+            Результат func; исключения пробрасываются как есть
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Асинхронный Database.get_job"""
+        return await self.run(self.database.get_job, job_id)
+    
+    async def get_counters(self, days: int = 30) -> Dict[str, Any]:
+        """Асинхронный Database.get_counters"""
+        return await self.run(self.database.get_counters, days)
 
 # Глобальный экземпляр базы данных
-db = Database()
\ No newline at end of file
+db = Database()
+
+# Асинхронный доступ к той же базе для обработчиков запросов
+async_db = AsyncDatabase(db)
\ No newline at end of file
@@ -21,14 +21,16 @@ class EmailService:
         self.smtp_from = SMTP_FROM
         self.smtp_tls = SMTP_TLS
     
-    def send_report_email(self, recipient_email: str, csv_content: bytes, queries_count: int) -> bool:
+    def send_report_email(self, recipient_email: str, report_content: bytes, queries_count: int,
+                          file_format: str = "csv") -> bool:
         """
         Отправка email с отчетом
         
         Args:
             recipient_email: Email получателя
-            csv_content: Содержимое CSV файла в байтах
+            report_content: Содержимое файла отчета в байтах
             queries_count: Количество обработанных запросов
+            file_format: Формат отчета (csv или parquet) - расширение вложения
             
         Returns:
             True если отправлено успешно, False иначе
@@ -49,7 +51,7 @@ class EmailService:
             Analysis Summary:
             - Total queries processed: {queries_count}
             - Analysis includes AIV-Score, competitor analysis, and geo-targeting results
-            - Results are attached as CSV file for further analysis
+            - Results are attached as {file_format.upper()} file for further analysis
             
             Key metrics included:
             • AIV-Score (0-100) for each query and domain
@@ -66,13 +68,13 @@ class EmailService:
             
             msg.attach(MIMEText(body, 'plain'))
             
-            # Прикрепление CSV файла
+            # Прикрепление файла отчета
             attachment = MIMEBase('application', 'octet-stream')
-            attachment.set_payload(csv_content)
+            attachment.set_payload(report_content)
             encoders.encode_base64(attachment)
             attachment.add_header(
                 'Content-Disposition',
-                f'attachment; filename="ai_visibility_report_{queries_count}_queries.csv"'
+                f'attachment; filename="ai_visibility_report_{queries_count}_queries.{file_format}"'
             )
             msg.attach(attachment)
             
@@ -1,12 +1,79 @@
 """
-Обработка файлов CSV/TSV/XLSX с поддержкой колонок Country, Prompt, Website
+Обработка файлов CSV/TSV/XLSX/Parquet/Arrow (и сжатых CSV/TSV) с поддержкой колонок Country, Prompt, Website
 """
 
 import os
+import io
+import gzip
+import zipfile
 import pandas as pd
-from typing import Tuple
+from contextlib import ExitStack
+from typing import Tuple, Iterator, Optional, Union, BinaryIO
 from urllib.parse import urlparse
-from config import MAX_ROWS_PROCESS
+from openpyxl import load_workbook
+from config import MAX_ROWS_PROCESS, FILE_BATCH_SIZE, XLSX_ENGINE, MAX_DECOMPRESSED_MB
+
+try:
+    # Опциональный быстрый движок чтения XLSX (Rust)
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+try:
+    # Опциональная поддержка .zst
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    # Опциональная поддержка Parquet / Arrow IPC
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Сжатые форматы загрузки (CSV/TSV внутри)
+COMPRESSION_EXTENSIONS = (".gz", ".zip", ".zst")
+
+# Колоночные форматы загрузки (читаются через pyarrow)
+ARROW_EXTENSIONS = (".parquet", ".arrow", ".feather", ".ipc")
+
+# Обязательные колонки после нормализации названий
+REQUIRED_COLUMNS = ['Country', 'Prompt', 'Website']
+
+# Векторное извлечение домена: netloc после необязательного http(s)://
+DOMAIN_PATTERN = r"^(?:https?://)?([^/?#]*)"
+WWW_PREFIX = r"^www\."
+UNSAFE_URL_CHARS = r"[\t\r\n]"
+# Значения, которые urlparse разбирает особо (IPv6 в скобках, не-ASCII netloc) - через extract_domain_from_url
+URLPARSE_SPECIAL_CHARS = r"[\[\]]|[^\x00-\x7f]"
+
+# Допустимые названия колонок во входном файле
+COLUMN_ALIASES = {
+    'Country': ['country', 'страна'],
+    'Prompt': ['prompt', 'query', 'запрос', 'запит'],
+    'Website': ['website', 'domain', 'домен', 'сайт']
+}
+
+class DecompressionLimit(io.RawIOBase):
+    """Обертка над потоком распаковки: ошибка, как только прочитано больше max_bytes"""
+    
+    def __init__(self, stream: BinaryIO, max_bytes: int):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(len(buffer))
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_bytes:
+            raise ValueError(f"Распакованный файл больше {self.max_bytes // (1024 * 1024)}МБ")
+        buffer[:len(data)] = data
+        return len(data)
 
 class FileProcessor:
     """Класс для обработки загруженных файлов"""
@@ -36,97 +103,414 @@ class FileProcessor:
             return ""
     
     @staticmethod
-    def process_file(file_path: str) -> Tuple[pd.DataFrame, int]:
+    def chunk_sizes(first_size: int, batch_size: int) -> Iterator[int]:
+        """Размеры блоков: начиная с first_size с удвоением до batch_size"""
+        size = max(1, min(first_size, batch_size))
+        while True:
+            yield size
+            size = min(size * 2, batch_size)
+    
+    @staticmethod
+    def iter_raw_chunks(file_path: str, batch_size: int,
+                        first_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
         """
-        Обработка файла и извлечение данных
+        Потоковое чтение файла блоками до batch_size строк
+        
+        Все значения читаются как строки, пустые ячейки - как пустые строки.
+        Первый блок - first_size строк, каждый следующий вдвое больше (до batch_size).
         
         Args:
             file_path: Путь к файлу
+            batch_size: Максимальное количество строк в блоке
+            first_size: Количество строк в первом блоке (по умолчанию batch_size)
             
-        Returns:
-            Tuple[DataFrame с данными, количество обработанных строк]
+        Yields:
+            DataFrame с исходными колонками файла
             
         Raises:
-            ValueError: Если файл неподдерживаемого формата или отсутствуют обязательные колонки
+            ValueError: Если файл неподдерживаемого формата
         """
-        ext = os.path.splitext(file_path.lower())[1]
+        ext = FileProcessor.get_file_extension(file_path)
+        sizes = FileProcessor.chunk_sizes(first_size or batch_size, batch_size)
         
         # Чтение файла в зависимости от расширения
-        if ext == ".csv":
-            df = pd.read_csv(file_path)
-        elif ext == ".tsv":
-            df = pd.read_csv(file_path, sep="\t")
+        if ext.endswith(COMPRESSION_EXTENSIONS):
+            yield from FileProcessor.iter_compressed_chunks(file_path, ext, sizes)
+        elif ext in (".csv", ".tsv"):
+            yield from FileProcessor.iter_csv_chunks(file_path, ext, sizes)
         elif ext == ".xlsx":
-            df = pd.read_excel(file_path)
+            yield from FileProcessor.iter_xlsx_chunks(file_path, sizes)
+        elif ext in ARROW_EXTENSIONS:
+            yield from FileProcessor.iter_arrow_chunks(file_path, ext, sizes)
         else:
             raise ValueError(f"Неподдерживаемый формат файла: {ext}")
+    
+    @staticmethod
+    def iter_csv_chunks(source: Union[str, BinaryIO], ext: str, sizes: Iterator[int]) -> Iterator[pd.DataFrame]:
+        """
+        Чтение CSV/TSV блоками из файла или бинарного потока
+        
+        Args:
+            source: Путь к файлу или поток
+            ext: .csv или .tsv
+            sizes: Размеры блоков (chunk_sizes)
+        """
+        sep = "\t" if ext == ".tsv" else ","
+        reader = pd.read_csv(source, sep=sep, dtype=str, keep_default_na=False, iterator=True)
+        with reader:
+            for size in sizes:
+                try:
+                    yield reader.get_chunk(size)
+                except StopIteration:
+                    return
+    
+    @staticmethod
+    def iter_compressed_chunks(file_path: str, ext: str, sizes: Iterator[int]) -> Iterator[pd.DataFrame]:
+        """
+        Потоковая распаковка .csv.gz / .tsv.gz / .zip / .csv.zst прямо в парсер CSV
+        
+        Распакованные данные не пишутся на диск. Объем распакованных данных
+        ограничен MAX_DECOMPRESSED_MB (защита от zip-бомб).
+        
+        Args:
+            file_path: Путь к сжатому файлу
+            ext: Расширение из get_file_extension (например .csv.gz)
+            sizes: Размеры блоков (chunk_sizes)
+            
+        Raises:
+            ValueError: Если формат внутри архива не поддерживается или превышен лимит распаковки
+        """
+        max_bytes = MAX_DECOMPRESSED_MB * 1024 * 1024
+        
+        with open(file_path, "rb") as raw, ExitStack() as stack:
+            if ext.endswith(".gz"):
+                inner_ext = ext[:-len(".gz")]
+                FileProcessor.validate_inner_extension(inner_ext, ext)
+                stream = stack.enter_context(gzip.GzipFile(fileobj=raw))
+            elif ext.endswith(".zst"):
+                inner_ext = ext[:-len(".zst")]
+                FileProcessor.validate_inner_extension(inner_ext, ext)
+                if zstandard is None:
+                    raise ValueError("Формат .zst не поддерживается: не установлен zstandard")
+                stream = stack.enter_context(zstandard.ZstdDecompressor().stream_reader(raw))
+            elif ext == ".zip":
+                archive = stack.enter_context(zipfile.ZipFile(raw))
+                members = [
+                    info for info in archive.infolist()
+                    if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+                    and os.path.splitext(info.filename.lower())[1] in (".csv", ".tsv")
+                ]
+                if not members:
+                    raise ValueError("В архиве нет CSV/TSV файла")
+                if members[0].file_size > max_bytes:
+                    raise ValueError(f"Распакованный файл больше {MAX_DECOMPRESSED_MB}МБ")
+                stream = stack.enter_context(archive.open(members[0]))
+                inner_ext = os.path.splitext(members[0].filename.lower())[1]
+            else:
+                raise ValueError(f"Неподдерживаемый формат файла: {ext}")
+            
+            limited = io.BufferedReader(DecompressionLimit(stream, max_bytes))
+            yield from FileProcessor.iter_csv_chunks(limited, inner_ext, sizes)
+    
+    @staticmethod
+    def validate_inner_extension(inner_ext: str, ext: str) -> None:
+        """
+        Проверка формата внутри .gz/.zst по имени файла (data.csv.gz)
+        
+        Raises:
+            ValueError: Если внутреннее расширение не .csv/.tsv (например, просто data.gz)
+        """
+        if inner_ext not in (".csv", ".tsv"):
+            raise ValueError(f"Неподдерживаемый формат файла: {ext} (ожидается .csv{ext} или .tsv{ext})")
+    
+    @staticmethod
+    def iter_xlsx_chunks(file_path: str, sizes: Iterator[int]) -> Iterator[pd.DataFrame]:
+        """
+        Потоковое чтение XLSX: только нужный лист и только нужные колонки
+        
+        По умолчанию openpyxl в read_only режиме: строки читаются потоком, без
+        построения объектной модели всей книги, и память не растет с размером листа.
+        python-calamine быстрее, но держит лист в памяти целиком, поэтому включается
+        только явно (XLSX_ENGINE=calamine) и только если установлен. Берется первый
+        лист, в заголовке которого есть все обязательные колонки.
+        
+        Args:
+            file_path: Путь к файлу
+            sizes: Размеры блоков (chunk_sizes)
+            
+        Yields:
+            DataFrame только с колонками Country, Prompt, Website (в исходных названиях)
+        """
+        if CalamineWorkbook is not None and XLSX_ENGINE == "calamine":
+            workbook = CalamineWorkbook.from_path(file_path)
+            sheet_names = workbook.sheet_names
+            open_rows = lambda name: iter(workbook.get_sheet_by_name(name).iter_rows())
+        else:
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+            sheet_names = workbook.sheetnames
+            open_rows = lambda name: workbook[name].iter_rows(values_only=True)
+        
+        try:
+            rows, header = None, None
+            for name in sheet_names:
+                sheet_rows = open_rows(name)
+                sheet_header = [FileProcessor.cell_to_str(cell).strip() for cell in next(sheet_rows, [])]
+                if rows is None:
+                    # Первый лист - запасной вариант, чтобы сообщить об отсутствующих колонках
+                    rows, header = sheet_rows, sheet_header
+                mapped = {FileProcessor.map_column(col) for col in sheet_header}
+                if all(col in mapped for col in REQUIRED_COLUMNS):
+                    rows, header = sheet_rows, sheet_header
+                    break
+            
+            if not header:
+                return
+            
+            # Остальные колонки (часто их десятки) не конвертируются вовсе
+            indices = [i for i, col in enumerate(header) if FileProcessor.map_column(col)]
+            columns = [header[i] for i in indices]
+            
+            batch, size = [], next(sizes)
+            for row in rows:
+                batch.append([FileProcessor.cell_to_str(row[i]) if i < len(row) else "" for i in indices])
+                if len(batch) >= size:
+                    yield pd.DataFrame(batch, columns=columns)
+                    batch, size = [], next(sizes)
+            if batch:
+                yield pd.DataFrame(batch, columns=columns)
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def iter_arrow_chunks(file_path: str, ext: str, sizes: Iterator[int]) -> Iterator[pd.DataFrame]:
+        """
+        Чтение Parquet / Arrow IPC (file или stream) через отображение файла в память
         
+        Читаются только нужные колонки; в pandas попадают только срезы по sizes строк.
+        Словарные (dictionary) колонки декодируются в строки при конвертации блока.
+        
+        Args:
+            file_path: Путь к файлу
+            ext: .parquet, .arrow, .feather или .ipc
+            sizes: Размеры блоков (chunk_sizes)
+            
+        Raises:
+            ValueError: Если pyarrow не установлен
+        """
+        if pa is None:
+            raise ValueError(f"Формат {ext} не поддерживается: не установлен pyarrow")
+        
+        with pa.memory_map(file_path, "r") as source:
+            if ext == ".parquet":
+                parquet_file = pq.ParquetFile(source)
+                columns = [name for name in parquet_file.schema_arrow.names if FileProcessor.map_column(name)]
+                record_batches = parquet_file.iter_batches(columns=columns)
+            else:
+                try:
+                    reader = pa.ipc.open_file(source)
+                    record_batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+                except pa.ArrowInvalid:
+                    # Не file-формат: Arrow IPC stream
+                    source.seek(0)
+                    reader = pa.ipc.open_stream(source)
+                    record_batches = iter(reader)
+                columns = [name for name in reader.schema.names if FileProcessor.map_column(name)]
+            
+            size = next(sizes)
+            pending = []
+            pending_rows = 0
+            for record_batch in record_batches:
+                record_batch = record_batch.select(columns)
+                offset = 0
+                while offset < record_batch.num_rows:
+                    # Срезы record batch не копируют данные
+                    piece = record_batch.slice(offset, size - pending_rows)
+                    pending.append(piece)
+                    pending_rows += piece.num_rows
+                    offset += piece.num_rows
+                    if pending_rows >= size:
+                        yield FileProcessor.arrow_to_frame(pending, columns)
+                        pending, pending_rows, size = [], 0, next(sizes)
+            if pending_rows or not columns:
+                yield FileProcessor.arrow_to_frame(pending, columns)
+    
+    @staticmethod
+    def arrow_to_frame(record_batches: list, columns: list) -> pd.DataFrame:
+        """Срезы record batch в DataFrame со строковыми колонками (None для пустых)"""
+        if not record_batches:
+            return pd.DataFrame(columns=columns)
+        table = pa.Table.from_batches(record_batches)
+        table = table.cast(pa.schema([(name, pa.string()) for name in table.column_names]))
+        return table.to_pandas()
+    
+    @staticmethod
+    def cell_to_str(cell) -> str:
+        """Значение ячейки XLSX в строку (пустые ячейки - пустая строка)"""
+        if cell is None:
+            return ""
+        if isinstance(cell, float) and cell.is_integer():
+            return str(int(cell))
+        return str(cell)
+    
+    @staticmethod
+    def map_column(name: str) -> Optional[str]:
+        """Стандартное название колонки по ее названию в файле (None если колонка не нужна)"""
+        lower_col = name.strip().lower()
+        for column, aliases in COLUMN_ALIASES.items():
+            if lower_col in aliases:
+                return column
+        return None
+    
+    @staticmethod
+    def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Приведение названий колонок к Country, Prompt, Website
+        
+        Raises:
+            ValueError: Если отсутствуют обязательные колонки
+        """
         # Нормализация названий колонок (приведение к нижнему регистру для поиска)
-        df.columns = df.columns.str.strip()
+        df.columns = df.columns.astype(str).str.strip()
         column_mapping = {}
         for col in df.columns:
-            lower_col = col.lower()
-            if lower_col in ['country', 'страна']:
-                column_mapping[col] = 'Country'
-            elif lower_col in ['prompt', 'query', 'запрос', 'запит']:
-                column_mapping[col] = 'Prompt'
-            elif lower_col in ['website', 'domain', 'домен', 'сайт']:
-                column_mapping[col] = 'Website'
+            mapped = FileProcessor.map_column(col)
+            if mapped:
+                column_mapping[col] = mapped
         
         # Переименование колонок
         df = df.rename(columns=column_mapping)
         
         # Проверка наличия обязательных колонок
-        required_columns = ['Country', 'Prompt', 'Website']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
         
         if missing_columns:
             raise ValueError(f"В файле отсутствуют обязательные колонки: {', '.join(missing_columns)}")
         
-        # Очистка и нормализация данных
-        df['Country'] = df['Country'].astype(str).str.strip()
-        df['Prompt'] = df['Prompt'].astype(str).str.strip()
-        df['Website'] = df['Website'].astype(str).str.strip()
+        return df[REQUIRED_COLUMNS].copy()
+    
+    @staticmethod
+    def extract_domains(websites: pd.Series) -> pd.Series:
+        """
+        Векторное извлечение доменов для всей колонки
+        
+        Повторяет extract_domain_from_url: netloc - все до первого / ? # после
+        необязательного http(s)://, в нижнем регистре и без www. Значения со
+        скобками или не-ASCII символами (urlparse проверяет в них IPv6 и
+        нормализацию и может отклонить URL) разбираются самой extract_domain_from_url.
+        
+        Args:
+            websites: Колонка Website (строки без пробелов по краям)
+            
+        Returns:
+            Колонка доменов (пустая строка, если домен не извлечен)
+        """
+        # Сайты в загрузках сильно повторяются - регулярные выражения применяются к уникальным значениям
+        codes, uniques = pd.factorize(websites)
+        raw = pd.Series(uniques, dtype=object)
+        
+        # urlparse удаляет табуляции и переводы строк внутри URL
+        cleaned = raw.str.replace(UNSAFE_URL_CHARS, "", regex=True)
+        netloc = cleaned.str.extract(DOMAIN_PATTERN, expand=False).fillna("").str.lower()
+        domains = netloc.str.replace(WWW_PREFIX, "", regex=True).to_numpy(dtype=object, copy=True)
         
-        # Удаление строк с пустыми значениями в обязательных колонках
-        df = df[
-            (df['Country'] != '') & 
-            (df['Prompt'] != '') & 
-            (df['Website'] != '')
-        ].reset_index(drop=True)
+        special = cleaned.str.contains(URLPARSE_SPECIAL_CHARS, regex=True).to_numpy(dtype=bool)
+        if special.any():
+            domains[special] = [FileProcessor.extract_domain_from_url(url) for url in raw[special]]
+        
+        return pd.Series(domains[codes], index=websites.index)
+    
+    @staticmethod
+    def clean_rows(df: pd.DataFrame) -> pd.DataFrame:
+        """Очистка значений, удаление пустых строк и извлечение target_domain"""
+        # Очистка и нормализация данных (пустые ячейки - пустые строки)
+        for col in REQUIRED_COLUMNS:
+            df[col] = df[col].fillna("").astype(str).str.strip()
         
         # Нормализация доменов (извлечение домена из URL если указан полный URL)
-        df['target_domain'] = df['Website'].apply(FileProcessor.extract_domain_from_url)
+        df['target_domain'] = FileProcessor.extract_domains(df['Website'])
+        
+        # Удаление строк с пустыми значениями и строк, где не удалось извлечь домен - одним фильтром
+        keep = (df[REQUIRED_COLUMNS + ['target_domain']] != '').all(axis=1)
+        return df[keep].reset_index(drop=True)
+    
+    @staticmethod
+    def iter_batches(file_path: str, batch_size: int = FILE_BATCH_SIZE,
+                     max_rows: int = MAX_ROWS_PROCESS) -> Iterator[pd.DataFrame]:
+        """
+        Генератор проверенных и нормализованных блоков строк
         
-        # Удаление строк где не удалось извлечь домен
-        df = df[df['target_domain'] != ''].reset_index(drop=True)
+        Файл читается блоками, поэтому память ограничена размером блока, а обработка
+        первых строк может начаться до того, как дочитан весь файл. Чтение
+        прекращается, как только набрано max_rows строк.
         
-        # Ограничение на количество строк (жесткий лимит MVP)
-        original_count = len(df)
-        df = df.head(MAX_ROWS_PROCESS)
-        processed_count = len(df)
+        Args:
+            file_path: Путь к файлу
+            batch_size: Количество строк в блоке
+            max_rows: Максимальное количество строк для обработки
+            
+        Yields:
+            DataFrame с колонками Country, Prompt, Website, target_domain
+            
+        Raises:
+            ValueError: Если файл неподдерживаемого формата или отсутствуют обязательные колонки
+        """
+        remaining = max_rows
+        # При малом лимите не читаем лишний блок целиком, но если в файле много
+        # пустых строк, блоки растут до batch_size, а не остаются крошечными
+        for chunk in FileProcessor.iter_raw_chunks(file_path, batch_size, first_size=max_rows):
+            batch = FileProcessor.clean_rows(FileProcessor.normalize_columns(chunk))
+            
+            # Ограничение на количество строк
+            batch = batch.head(remaining)
+            if len(batch):
+                yield batch
+                remaining -= len(batch)
+            if remaining <= 0:
+                return
+    
+    @staticmethod
+    def process_file(file_path: str) -> Tuple[pd.DataFrame, int]:
+        """
+        Обработка файла и извлечение данных
         
-        return df, processed_count
+        Args:
+            file_path: Путь к файлу
+            
+        Returns:
+            Tuple[DataFrame с данными, количество обработанных строк]
+            
+        Raises:
+            ValueError: Если файл неподдерживаемого формата или отсутствуют обязательные колонки
+        """
+        batches = list(FileProcessor.iter_batches(file_path))
+        if batches:
+            df = pd.concat(batches, ignore_index=True)
+        else:
+            df = pd.DataFrame(columns=REQUIRED_COLUMNS + ['target_domain'])
+        return df, len(df)
     
     @staticmethod
-    def validate_file_size(content: bytes, max_size_mb: int) -> None:
+    def validate_file_size(size_bytes: int, max_size_mb: int) -> None:
         """
         Проверка размера файла
         
         Args:
-            content: Содержимое файла в байтах
+            size_bytes: Размер файла (или уже прочитанной части) в байтах
             max_size_mb: Максимальный размер в МБ
             
         Raises:
             ValueError: Если файл слишком большой
         """
-        size_mb = len(content) / (1024 * 1024)
+        size_mb = size_bytes / (1024 * 1024)
         if size_mb > max_size_mb:
-            raise ValueError(f"Файл слишком большой: {size_mb:.2f}МБ > {max_size_mb}МБ")
+            raise ValueError(f"Файл занадто великий: {size_mb:.2f} МБ > {max_size_mb} МБ")
     
     @staticmethod
     def get_file_extension(filename: str) -> str:
-        """Получение расширения файла"""
+        """Получение расширения файла (для .gz/.zst - вместе с внутренним, например .csv.gz)"""
         if not filename:
             return ".csv"  # Дефолтное расширение
-        return os.path.splitext(filename.lower())[1] or ".csv"
\ No newline at end of file
+        base, ext = os.path.splitext(filename.lower())
+        if ext in (".gz", ".zst"):
+            return os.path.splitext(base)[1] + ext
+        return ext or ".csv"
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+Хеджирование запросов: дубль медленного запроса после задержки порядка p95
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Dict, Any
+from config import (
+    OPENAI_HEDGE_PERCENTILE, OPENAI_HEDGE_DELAY_SECONDS, OPENAI_HEDGE_MIN_DELAY_SECONDS, OPENAI_HEDGE_BUDGET
+)
+
+class LatencyTracker:
+    """
+    Задержки последних успешных запросов для выбора момента хеджа
+    
+    Пока замеров меньше min_samples, используется задержка по умолчанию.
+    """
+    
+    def __init__(self, percentile: float = OPENAI_HEDGE_PERCENTILE, default_delay: float = OPENAI_HEDGE_DELAY_SECONDS,
+                 min_delay: float = OPENAI_HEDGE_MIN_DELAY_SECONDS, window: int = 200, min_samples: int = 20):
+        self.percentile = min(100.0, max(0.0, percentile))
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, latency: float) -> None:
+        """Замер задержки успешного запроса в секундах"""
+        with self._lock:
+            self._samples.append(latency)
+    
+    def delay(self) -> float:
+        """Через сколько секунд без ответа отправлять дубль запроса"""
+        with self._lock:
+            samples = sorted(self._samples) if len(self._samples) >= self.min_samples else None
+        if samples is None:
+            return self.default_delay
+        rank = max(0, math.ceil(len(samples) * self.percentile / 100) - 1)
+        return max(self.min_delay, samples[rank])
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Текущая задержка хеджа для /metrics"""
+        with self._lock:
+            samples = len(self._samples)
+        return {"delay_seconds": round(self.delay(), 3), "samples": samples}
+
+class HedgeBudget:
+    """
+    Бюджет дублей на одну задачу
+    
+    Разрешено ratio дублей на каждый запрос к API плюс reserve, чтобы и
+    небольшой файл мог захеджировать зависший запрос. Дополнительная стоимость
+    задачи не превышает ratio от числа запросов (плюс reserve).
+    """
+    
+    def __init__(self, ratio: float = OPENAI_HEDGE_BUDGET, reserve: int = 1):
+        self.ratio = max(0.0, ratio)
+        self.reserve = reserve
+        self.calls = 0
+        self.spent = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+    
+    def note_call(self) -> None:
+        """Учет запроса к API (пополняет бюджет на ratio)"""
+        with self._lock:
+            self.calls += 1
+    
+    def try_spend(self) -> bool:
+        """Списание одного дубля, если бюджет позволяет"""
+        with self._lock:
+            if self.spent + 1 <= self.reserve + self.ratio * self.calls:
+                self.spent += 1
+                return True
+            self.denied += 1
+            return False
+    
+    def refund(self) -> None:
+        """Возврат дубля, который не удалось отправить (нет свободного слота)"""
+        with self._lock:
+            self.spent -= 1
@@ -0,0 +1,89 @@
+"""
+Шина событий прогресса задач для SSE подписчиков
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Tuple
+from config import JOB_EVENTS_HISTORY, JOB_EVENTS_MAX_JOBS
+
+class JobEventBus:
+    """
+    Событийная шина внутри процесса: воркеры публикуют события из своих потоков,
+    SSE обработчики получают их через asyncio.Queue в своем event loop.
+    
+    Для каждой задачи хранится короткая история, чтобы клиент, переподключившийся
+    с Last-Event-ID, получил пропущенные события.
+    """
+    
+    def __init__(self, history: int = JOB_EVENTS_HISTORY, max_jobs: int = JOB_EVENTS_MAX_JOBS):
+        self.history = history
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._events: "OrderedDict[str, deque]" = OrderedDict()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        # Id последнего вытесненного из истории события задачи
+        self._dropped: Dict[str, int] = {}
+        self._seq = 0
+    
+    def publish(self, job_id: str, event: str, data: Dict[str, Any]) -> None:
+        """
+        Публикация события (потокобезопасно)
+        
+        Args:
+            job_id: Идентификатор задачи
+            event: Тип события (stage, row, status)
+            data: Данные события
+        """
+        with self._lock:
+            self._seq += 1
+            item = {"id": self._seq, "event": event, "ts": time.time(), "data": data}
+            
+            events = self._events.get(job_id)
+            if events is None:
+                events = self._events[job_id] = deque(maxlen=self.history)
+                # Ограничиваем память: забываем самые старые задачи
+                while len(self._events) > self.max_jobs:
+                    evicted, _ = self._events.popitem(last=False)
+                    self._dropped.pop(evicted, None)
+            elif len(events) == events.maxlen:
+                self._dropped[job_id] = events[0]["id"]
+            events.append(item)
+            
+            for loop, queue in self._subscribers.get(job_id, []):
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+    
+    def subscribe(self, job_id: str, after_id: int = 0) -> Tuple[asyncio.Queue, List[Dict[str, Any]], bool]:
+        """
+        Подписка на события задачи (вызывается из корутины)
+        
+        Args:
+            job_id: Идентификатор задачи
+            after_id: Id последнего полученного клиентом события (Last-Event-ID)
+        
+        Returns:
+            Tuple[очередь новых событий, накопленные события с id > after_id,
+            признак полноты: история задачи есть и после after_id ничего не вытеснено]
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append((loop, queue))
+            events = self._events.get(job_id)
+            backlog = [item for item in events if item["id"] > after_id] if events is not None else []
+            complete = events is not None and self._dropped.get(job_id, 0) <= after_id
+        return queue, backlog, complete
+    
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        """Отписка от событий задачи"""
+        with self._lock:
+            subscribers = [s for s in self._subscribers.get(job_id, []) if s[1] is not queue]
+            if subscribers:
+                self._subscribers[job_id] = subscribers
+            else:
+                self._subscribers.pop(job_id, None)
+
+# Глобальная шина событий
+job_events = JobEventBus()
@@ -0,0 +1,229 @@
+"""
+Пул фоновых воркеров поверх очереди задач в SQLite
+"""
+
+import math
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from config import JOB_WORKERS, JOB_QUEUE_SIZE, JOB_DEFAULT_SECONDS, JOB_LEASE_SECONDS, JOB_POLL_SECONDS
+from database import db
+from job_events import job_events
+
+class QueueFullError(Exception):
+    """Очередь задач заполнена"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__(f"Черга заповнена, спробуйте через {retry_after} с")
+        self.retry_after = retry_after
+
+class JobPostponedError(Exception):
+    """
+    Задачу нельзя выполнить сейчас (внешний сервис недоступен)
+    
+    Задача возвращается в очередь без расхода попытки, а воркеры не берут
+    новые задачи retry_after секунд.
+    """
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class JobFailedError(Exception):
+    """
+    Неустранимая ошибка задачи (например, некорректный входной файл)
+    
+    Повтор даст тот же результат, поэтому задача сразу получает статус failed,
+    не расходуя оставшиеся попытки.
+    """
+
+class JobExecutor:
+    """
+    Фиксированное количество воркеров, которые атомарно забирают задачи из таблицы jobs.
+    
+    Задачи переживают перезапуск процесса: незавершенные задачи с истекшей арендой
+    снова забираются воркерами после старта.
+    """
+    
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.handler: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.avg_job_seconds = JOB_DEFAULT_SECONDS
+        self.postponed = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+    
+    def start(self, handler: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        Запуск воркеров (повторный вызов ничего не делает)
+        
+        Args:
+            handler: Функция обработки задачи, принимает Dict с полями из таблицы jobs
+        """
+        with self._lock:
+            if self._threads:
+                return
+            self.handler = handler
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    args=(f"{self._owner_prefix}:{i}",),
+                    name=f"job-worker-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+    
+    def enqueue(self, email: str, ip: str, file_path: str, country: str = "", file_hash: Optional[str] = None,
+                allow_retry: bool = False) -> str:
+        """
+        Постановка задачи в очередь
+        
+        Место в очереди проверяется в той же транзакции, что и регистрация
+        загрузки: отказ из-за заполненной очереди не засчитывает файл.
+        
+        Args:
+            email: Email для отправки отчета
+            ip: IP адрес пользователя
+            file_path: Путь к сохраненному файлу загрузки
+            country: Код страны клиента
+            file_hash: Хеш файла для проверки повторной загрузки (None - без проверки)
+            allow_retry: Разрешить повторную обработку того же файла
+            
+        Returns:
+            Идентификатор задачи
+            
+        Raises:
+            QueueFullError: Если очередь заполнена
+            PermissionError: Если этот файл уже обрабатывался с данного IP
+        """
+        job_id = db.create_job(email, ip, file_path, country, file_hash, allow_retry, max_queued=self.queue_size)
+        if job_id is None:
+            raise QueueFullError(self.estimate_retry_after(db.count_jobs("queued")))
+        self._wakeup.set()
+        return job_id
+    
+    def _worker_loop(self, worker_id: str) -> None:
+        """Цикл воркера: захватываем задачу из БД и выполняем"""
+        while True:
+            pause = self.paused_for()
+            if pause > 0:
+                # Зависимость недоступна: задачи остаются в очереди до конца паузы
+                time.sleep(min(pause, JOB_POLL_SECONDS))
+                continue
+            
+            try:
+                job = db.claim_job(worker_id, JOB_LEASE_SECONDS)
+            except Exception as e:
+                print(f"Database warning: {e}")
+                job = None
+            
+            if job is None:
+                # Ждем новую задачу или периодически проверяем задачи с истекшей арендой
+                self._wakeup.wait(JOB_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+            
+            self._run_job(job, worker_id)
+    
+    def _run_job(self, job: Dict[str, Any], worker_id: str) -> None:
+        """Выполнение задачи с продлением аренды"""
+        with self._lock:
+            self.busy += 1
+        started = time.monotonic()
+        
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop,
+            args=(job["id"], worker_id, stop_heartbeat),
+            daemon=True
+        )
+        heartbeat.start()
+        
+        error = None
+        postponed = False
+        final = False
+        try:
+            self.handler(job)
+        except JobFailedError as e:
+            error = str(e) or e.__class__.__name__
+            final = True
+            print(f"❌ Задача {job['id']} завершена без повторов: {error}")
+        except JobPostponedError as e:
+            error = str(e)
+            postponed = True
+            self.pause(e.retry_after)
+            print(f"⏸️ Задача {job['id']} отложена: {error}")
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            print(f"❌ Ошибка в задаче {job['id']}: {error}")
+        finally:
+            stop_heartbeat.set()
+            status = db.finish_job(job["id"], worker_id, error, postpone=postponed, final=final)
+            job_events.publish(job["id"], "status", {"status": status, "error": error})
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.busy -= 1
+                if status == "done":
+                    self.completed += 1
+                elif status == "failed":
+                    self.failed += 1
+                if postponed:
+                    self.postponed += 1
+                # Экспоненциальное сглаживание среднего времени задачи: отложенные и
+                # возвращенные в очередь попытки прерываются раньше и занижали бы оценку
+                if status in ("done", "failed"):
+                    self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * elapsed
+    
+    @staticmethod
+    def _heartbeat_loop(job_id: str, worker_id: str, stop: threading.Event) -> None:
+        """Продление аренды, пока задача выполняется"""
+        while not stop.wait(JOB_LEASE_SECONDS / 3):
+            try:
+                db.renew_lease(job_id, worker_id, JOB_LEASE_SECONDS)
+            except Exception as e:
+                print(f"Database warning: {e}")
+    
+    def pause(self, seconds: float) -> None:
+        """Пауза в захвате задач (не сокращает уже назначенную)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+    
+    def paused_for(self) -> float:
+        """Сколько секунд еще длится пауза в захвате задач"""
+        with self._lock:
+            return max(0.0, self._paused_until - time.monotonic())
+    
+    def estimate_retry_after(self, depth: int) -> int:
+        """Оценка времени до освобождения места в очереди (секунды)"""
+        with self._lock:
+            avg = self.avg_job_seconds
+        return max(1, math.ceil((depth + 1) / self.workers * avg))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Состояние пула для мониторинга"""
+        queue_depth = db.count_jobs("queued")
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "busy_workers": self.busy,
+                "queue_depth": queue_depth,
+                "queue_size": self.queue_size,
+                "avg_job_seconds": round(self.avg_job_seconds, 2),
+                "completed": self.completed,
+                "failed": self.failed,
+                "postponed": self.postponed,
+                "paused_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1)
+            }
+
+# Глобальный пул воркеров
+job_executor = JobExecutor()
@@ -3,24 +3,42 @@
 """
 
 import os
-import tempfile
+import hmac
+import json
+import math
+import time
+import asyncio
 import threading
-import hashlib
-from typing import Optional
-import pandas as pd
-from io import BytesIO
+import anyio
+from typing import Optional, Dict, Any
 
-from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse, StreamingResponse, HTMLResponse
 from starlette.middleware.cors import CORSMiddleware
 
 # Импорт наших модулей
-from config import EMAIL_REGEX, MAX_UPLOAD_MB, ALLOW_RETRY_SAME_FILE, validate_config
-from database import db
+from config import (
+    EMAIL_REGEX, MAX_UPLOAD_MB, ALLOW_RETRY_SAME_FILE, UPLOAD_DIR, JOB_MAX_ATTEMPTS, SSE_KEEPALIVE_SECONDS,
+    MAX_ROWS_PROCESS, FILE_BATCH_SIZE, REPORT_FORMAT, STATS_CACHE_SECONDS, STATS_DAYS, JOB_DEADLINE_SECONDS,
+    ADMIN_TOKEN, validate_config
+)
+from database import db, async_db
 from file_processor import FileProcessor
-from openai_client import openai_client
-from metrics import MetricsCalculator
+from openai_client import openai_client, SearchUnavailableError, CircuitOpenError
+from pipeline import QueryPipeline
+from report import create_report_writer
+from job_queue import job_executor, QueueFullError, JobPostponedError, JobFailedError
+from job_events import job_events
+from response_cache import response_cache
+from rate_limit import ip_rate_limiter, email_rate_limiter
 from email_service import email_service
+from upload import UploadSpooler, UploadFormError
+
+# Запас на multipart-заголовки и поле email при проверке Content-Length
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# Кэш ответа /stats в памяти процесса
+stats_cache: Dict[str, Any] = {"data": None, "expires": 0.0}
 
 # Создание FastAPI приложения
 app = FastAPI(
@@ -37,6 +55,39 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+@app.middleware("http")
+async def limit_upload_rate(request: Request, call_next):
+    """
+    Ограничение частоты загрузок с одного IP до чтения и хеширования тела запроса
+    """
+    if ip_rate_limiter and request.method == "POST" and request.url.path == "/upload":
+        retry_after = ip_rate_limiter.try_acquire(get_client_ip(request))
+        if retry_after:
+            return rate_limited_response(retry_after)
+    return await call_next(request)
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """
+    Отказ по Content-Length до чтения тела загрузки (без заголовка лимит проверяется при разборе)
+    """
+    if request.method == "POST" and request.url.path == "/upload":
+        content_length = request.headers.get("content-length")
+        max_bytes = MAX_UPLOAD_MB * 1024 * 1024 + UPLOAD_FORM_OVERHEAD
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            return JSONResponse(
+                {"detail": f"Файл занадто великий. Максимум {MAX_UPLOAD_MB} МБ"},
+                status_code=413
+            )
+    return await call_next(request)
+
+@app.on_event("startup")
+def start_job_workers():
+    """
+    Запуск воркеров: подхватывают задачи, оставшиеся в очереди после перезапуска
+    """
+    job_executor.start(process_file_worker)
+
 # HTML лендинг страницы встроенный в код
 LANDING_HTML = """<!DOCTYPE html>
 <html lang="uk">
@@ -504,6 +555,14 @@ LANDING_HTML = """<!DOCTYPE html>
                         <p class="text-green-600 text-lg mb-8">
                             Обробка файлу займає 2-5 хвилин. Результати прийдуть на <strong id="userEmailDisplay"></strong>
                         </p>
+
+                        <!-- Job Progress -->
+                        <div id="jobProgress" class="hidden bg-white rounded-lg p-4 border border-green-200 mb-8">
+                            <div class="w-full bg-gray-200 rounded-full h-2 mb-2">
+                                <div id="jobProgressBar" class="bg-green-600 h-2 rounded-full timer-progress" style="width: 0%"></div>
+                            </div>
+                            <p id="jobProgressText" class="text-sm text-green-700">Обробка файлу...</p>
+                        </div>
                         
                         <button id="backToMainFromSuccess" class="text-gray-600 underline underline-offset-4 decoration-gray-400 hover:decoration-2 font-medium transition-all">
                             ← Повернутись на головну
@@ -719,22 +778,101 @@ usb-c хаб
             submitButtonText.classList.add('hidden');
             submitSpinner.classList.remove('hidden');
 
-            // Simulate API call
-            await new Promise(resolve => setTimeout(resolve, 2000));
+            // Upload file
+            const formData = new FormData();
+            formData.append('file', currentFile);
+            formData.append('email', currentEmail);
+
+            let result = null;
+            try {
+                const response = await fetch('/upload', { method: 'POST', body: formData });
+                result = await response.json();
+                if (!response.ok) {
+                    throw new Error(result.detail || 'Помилка завантаження файлу');
+                }
+            } catch (err) {
+                showEmailError(err.message);
+                submitButtonText.classList.remove('hidden');
+                submitSpinner.classList.add('hidden');
+                return;
+            }
 
             // Show success page
             document.getElementById('userEmailDisplay').textContent = currentEmail;
             showPage('successPage');
             hasUsedService = true;
+            trackJobProgress(result.job_id);
 
             // Reset loading state
             submitButton.disabled = false;
             submitButtonText.classList.remove('hidden');
             submitSpinner.classList.add('hidden');
 
-            console.log(`Form submitted: ${currentEmail}, file: ${currentFile.name}`);
+            console.log(`Form submitted: ${currentEmail}, file: ${currentFile.name}, job: ${result.job_id}`);
         });
 
+        // Real job progress via Server-Sent Events
+        function trackJobProgress(jobId) {
+            if (!jobId || !window.EventSource) {
+                return;
+            }
+
+            const progress = document.getElementById('jobProgress');
+            const progressBar = document.getElementById('jobProgressBar');
+            const progressText = document.getElementById('jobProgressText');
+            let rowsTotal = 0;
+            // Строки из снимка статуса + строки из событий row после него (по row_idx, без повторов)
+            let rowsBase = 0;
+            const seenRows = new Set();
+
+            progress.classList.remove('hidden');
+            const source = new EventSource(`/jobs/${jobId}/events`);
+
+            function render() {
+                const rowsDone = rowsTotal ? Math.min(rowsBase + seenRows.size, rowsTotal) : rowsBase + seenRows.size;
+                const percent = rowsTotal ? Math.round(rowsDone / rowsTotal * 100) : 0;
+                progressBar.style.width = percent + '%';
+                progressText.textContent = rowsTotal ? `Оброблено запитів: ${rowsDone} з ${rowsTotal}` : `Оброблено запитів: ${rowsDone}`;
+            }
+
+            source.addEventListener('status', (e) => {
+                const data = JSON.parse(e.data);
+                if (data.rows_total) {
+                    rowsTotal = data.rows_total;
+                }
+                if (data.rows_done !== undefined) {
+                    rowsBase = data.rows_done || 0;
+                    seenRows.clear();
+                }
+                if (data.status === 'done') {
+                    rowsBase = rowsTotal;
+                    render();
+                    progressText.textContent = 'Готово! Звіт надіслано на email.';
+                    source.close();
+                    return;
+                }
+                if (data.status === 'failed') {
+                    progressText.textContent = 'Не вдалося обробити файл.';
+                    source.close();
+                    return;
+                }
+                render();
+            });
+
+            source.addEventListener('stage', (e) => {
+                const data = JSON.parse(e.data);
+                if (data.stage === 'parse') {
+                    rowsTotal = data.rows_total;
+                    render();
+                }
+            });
+
+            source.addEventListener('row', (e) => {
+                seenRows.add(JSON.parse(e.data).row_idx);
+                render();
+            });
+        }
+
         // Back buttons
         document.getElementById('backToMain')?.addEventListener('click', () => {
             showPage('uploadPage');
@@ -787,119 +925,398 @@ async def get_landing_page():
     return HTMLResponse(content=LANDING_HTML)
 
 @app.post("/upload")
-async def handle_upload(request: Request, file: UploadFile = File(...), email: str = Form(...)):
+async def handle_upload(request: Request):
     """
     Обработка загруженного файла
+    
+    Тело запроса разбирается потоково (см. spool_upload): файл сразу пишется на
+    диск, поэтому форма не параметризуется через File/Form - иначе Starlette
+    прочитал бы все тело до вызова обработчика.
     """
+    client_ip = get_client_ip(request)
+    client_country = get_client_country(request)
+    
+    # Потоково сохраняем файл на диск, считая хеш и размер по ходу чтения
+    try:
+        spooler = await spool_upload(request, MAX_UPLOAD_MB)
+    except UploadFormError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        print(f"Ошибка сохранения файла: {e}")
+        raise HTTPException(status_code=500, detail="Помилка збереження файлу")
+    temp_file_path, file_hash, file_size = spooler.file_path, spooler.file_hash, spooler.size
+    email = spooler.fields.get("email", "")
+    
     # Валидация email
     if not EMAIL_REGEX.match(email):
+        spooler.discard()
         raise HTTPException(status_code=400, detail="Некоректний формат email")
     
-    # Считываем содержимое файла
-    content = await file.read()
-    if not content:
+    # Лимит по email - до обращения к БД
+    if email_rate_limiter:
+        retry_after = email_rate_limiter.try_acquire(email.strip().lower())
+        if retry_after:
+            spooler.discard()
+            return rate_limited_response(retry_after)
+    
+    if file_size == 0:
+        spooler.discard()
         raise HTTPException(status_code=400, detail="Файл пустий")
 
-    print(f"Прийнято файл: {file.filename} від {get_client_ip(request)} для {email}")
-
-    # Валидация размера файла
-    # Добавил этот блок в worker, чтобы не ждать здесь
-    # try:
-    #     FileProcessor.validate_file_size(content, MAX_UPLOAD_MB)
-    # except ValueError as e:
-    #     raise HTTPException(status_code=400, detail=str(e))
-    
-    # Проверяем не использовал ли пользователь уже сервис
-    # Хэш файла для проверки, чтобы пользователь не отправлял один и тот же файл много раз
-    client_ip = get_client_ip(request)
-    file_hash = hashlib.sha256(content).hexdigest()
+    print(f"Прийнято файл: {spooler.filename} ({file_size} байт) від {client_ip} для {email}")
     
+    # Ставим задачу в персистентную очередь (запись в БД - в потоке БД). В той же транзакции
+    # проверяем, не использовал ли пользователь уже сервис: хэш файла не дает отправлять один
+    # и тот же файл много раз, а при заполненной очереди загрузка не засчитывается
+    job_executor.start(process_file_worker)
     try:
-        db.check_ip_file_access(client_ip, file_hash, ALLOW_RETRY_SAME_FILE)
+        job_id = await async_db.run(
+            job_executor.enqueue, email, client_ip, temp_file_path, client_country, file_hash, ALLOW_RETRY_SAME_FILE
+        )
     except PermissionError as e:
+        os.remove(temp_file_path)
         raise HTTPException(status_code=429, detail=str(e))
-    except Exception as e:
-        print(f"Database warning: {e}")
-        pass
-    
-    # Сохраняем файл во временную директорию для обработки
-    file_extension = FileProcessor.get_file_extension(file.filename)
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Ошибка сохранения файла")
-    
-    # Запускаем обработку в отдельном потоке
-    worker_thread = threading.Thread(
-        target=process_file_worker,
-        args=(temp_file_path, email, client_ip),
-        daemon=True
-    )
-    worker_thread.start()
+    except QueueFullError as e:
+        os.remove(temp_file_path)
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     
     # Возвращаем мгновенный ответ
     return JSONResponse({
         "ok": True,
         "email": email,
+        "job_id": job_id,
         "status": "processing",
         "message": "Файл прийнято в обробку. Очікуйте звіт на email."
     })
 
-def process_file_worker(file_path: str, email: str, client_ip: str):
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    Статус задачи и прогресс по строкам
+    """
+    job = await async_db.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Завдання не знайдено")
+    return JSONResponse(job)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events с прогрессом задачи: stage, row и status события от воркера
+    """
+    job = await async_db.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Завдання не знайдено")
+    
+    last_event_id = request.headers.get("last-event-id", "")
+    last_event_id = int(last_event_id) if last_event_id.isdigit() else None
+    
+    async def event_stream():
+        queue, backlog, complete = job_events.subscribe(job_id, last_event_id or 0)
+        try:
+            if last_event_id is not None and complete:
+                # Переподключение: только события, пропущенные после Last-Event-ID
+                for item in backlog:
+                    yield format_sse(item["event"], item["data"], item["id"])
+                    if item["event"] == "status" and item["data"].get("status") in ("done", "failed"):
+                        return
+            else:
+                # Новое подключение (или история вытеснена): снимок из БД вместо истории событий -
+                # rows_done уже учитывает все обработанные строки. Id снимка - последнее событие
+                # до подписки, чтобы переподключение продолжило с него
+                snapshot = await async_db.get_job(job_id)
+                yield format_sse("status", snapshot, backlog[-1]["id"] if backlog else None)
+                if snapshot is None or snapshot["status"] in ("done", "failed"):
+                    return
+            
+            while not await request.is_disconnected():
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Воркер мог работать в другом процессе - отдаем снимок статуса из БД
+                    snapshot = await async_db.get_job(job_id)
+                    yield format_sse("status", snapshot)
+                    if snapshot is None or snapshot["status"] in ("done", "failed"):
+                        return
+                    continue
+                
+                yield format_sse(item["event"], item["data"], item["id"])
+                if item["event"] == "status" and item["data"].get("status") in ("done", "failed"):
+                    return
+        finally:
+            job_events.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/stats")
+async def get_usage_stats(request: Request):
+    """
+    Статистика загрузок и отправленных отчетов по дням и странам
+    
+    Счетчики ведутся в БД при каждой записи; ответ кэшируется на STATS_CACHE_SECONDS.
+    Доступ - только с ADMIN_TOKEN.
+    """
+    check_admin_token(request)
+    now = time.monotonic()
+    if stats_cache["data"] is None or now >= stats_cache["expires"]:
+        stats_cache["data"] = await async_db.get_counters(STATS_DAYS)
+        stats_cache["expires"] = now + STATS_CACHE_SECONDS
+    return JSONResponse(stats_cache["data"])
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """
+    Состояние очереди задач и кэша для мониторинга
+    
+    Счетчики очереди читаются из БД - в потоке БД, а не в event loop.
+    Доступ - только с ADMIN_TOKEN.
+    """
+    check_admin_token(request)
+    return JSONResponse({
+        "jobs": await async_db.run(job_executor.get_stats),
+        "cache": response_cache.get_stats() if response_cache else None,
+        "openai": openai_client.get_stats(),
+        "rate_limit": {
+            "ip": ip_rate_limiter.get_stats() if ip_rate_limiter else None,
+            "email": email_rate_limiter.get_stats() if email_rate_limiter else None
+        }
+    })
+
+def process_file_worker(job: Dict[str, Any]):
     """
     Фоновая задача для обработки файла и отправки отчета
+    
+    Вызывается воркером JobExecutor. Исключения пробрасываются наружу, чтобы задача
+    вернулась в очередь для повторной попытки. Прогресс публикуется в job_events.
     """
+    job_id = job["id"]
+    file_path = job["file_path"]
+    report_path = os.path.join(UPLOAD_DIR, f"{job_id}.report.{REPORT_FORMAT}")
+    
+    def publish_stage(stage: str, started: float, **data):
+        job_events.publish(job_id, "stage", {
+            "stage": stage,
+            "duration_ms": round((time.monotonic() - started) * 1000),
+            **data
+        })
+    
     try:
-        print(f"Начало обработки файла {file_path}")
+        print(f"Начало обработки задачи {job_id} (попытка {job['attempts']})")
+        job_events.publish(job_id, "status", {"status": "running", "attempts": job["attempts"]})
 
-        # Обработка файла
-        df, queries_count = FileProcessor.process_file(file_path)
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        report = create_report_writer(report_path, REPORT_FORMAT)
+        ingest = {"rows_total": job["rows_total"], "started": time.monotonic()}
         
-        # Запрос к OpenAI
-        all_results = []
-        for index, row in df.iterrows():
-            country = row['Country']
-            prompt = row['Prompt']
-            website = row['Website']
-            
-            # Запрос к OpenAI
-            response_data = openai_client.search_with_web(prompt)
+        def job_batches():
+            """Блоки строк задачи: из файла при первом разборе, дальше - из БД"""
+            offset = 0
+            if ingest["rows_total"] is None:
+                # Строки сохраняются в БД по мере чтения файла и сразу уходят в обработку
+                try:
+                    for batch in FileProcessor.iter_batches(file_path, FILE_BATCH_SIZE, MAX_ROWS_PROCESS):
+                        db.save_job_rows(job_id, batch.to_dict('records'), offset)
+                        rows = db.get_job_rows(job_id, offset, len(batch))
+                        offset += len(rows)
+                        yield rows
+                except ValueError as e:
+                    # Ошибка во входном файле (формат, колонки, кодировка) повторится при любой попытке
+                    raise JobFailedError(str(e)) from e
+                db.set_job_rows_total(job_id, offset)
+                ingest["rows_total"] = offset
+                publish_stage("parse", ingest["started"], rows_total=offset)
+                
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    print(f"Временный файл {file_path} удален.")
+            else:
+                while offset < ingest["rows_total"]:
+                    rows = db.get_job_rows(job_id, offset, FILE_BATCH_SIZE)
+                    if not rows:
+                        break
+                    offset += len(rows)
+                    yield rows
+        
+        def checkpointed(batches):
+            # Строки из чекпоинта сразу попадают в отчет
+            for rows in batches:
+                for row in rows:
+                    if row["metrics"]:
+                        report.add(row["row_idx"], row["metrics"])
+                yield rows
+        
+        progress = {"rows": 0, "lock": threading.Lock()}
+        
+        def on_row_done(row: Dict[str, Any], response_data: Dict[str, Any], metrics_data: Dict[str, Any]):
+            # Срок попытки истек, но строки в ней обработаны: большой файл продолжается в
+            # следующей попытке с чекпоинта, попытка не расходуется
+            if response_data.get("deadline_exceeded") and progress["rows"]:
+                raise JobPostponedError(
+                    f"Срок попытки истек после {progress['rows']} строк, задача продолжится", 0
+                )
+            # Временная ошибка после всех повторов: вместо строки с ошибкой задача возвращается
+            # в очередь (готовые строки уже сохранены); на последней попытке строки без ответа
+            # попадают в отчет с колонкой "Помилка"
+            if response_data.get("retryable") and job["attempts"] < JOB_MAX_ATTEMPTS:
+                raise SearchUnavailableError(response_data["error"])
             
-            # Расчет метрик
-            metrics_data = MetricsCalculator.calculate_metrics(
-                country=country,
-                target_domain=website,
-                sources=response_data['sources']
-            )
-            all_results.append(metrics_data)
-
-        # Создание отчета
-        report_df = pd.DataFrame(all_results)
+            # Ответы с ошибкой не сохраняем, чтобы при повторе запрос ушел заново
+            if "error" not in response_data:
+                db.save_row_result(job_id, row["row_idx"], response_data["sources"], metrics_data)
+                with progress["lock"]:
+                    progress["rows"] += 1
+            report.add(row["row_idx"], metrics_data)
+            job_events.publish(job_id, "row", {
+                "row_idx": row["row_idx"],
+                "target_domain": metrics_data["Целевой домен"],
+                "aiv_score": metrics_data["AIV-Score"],
+                "cached": response_data.get("cached", False),
+                "latency_ms": response_data.get("latency_ms"),
+                "attempts": response_data.get("attempts", 1),
+                "error": response_data.get("error")
+            })
+        
+        # Разбор файла и запросы к OpenAI идут параллельно; каждая строка сохраняется сразу
+        started = time.monotonic()
+        pipeline = QueryPipeline(
+            openai_client,
+            concurrency=openai_client.max_concurrency,
+            on_row_done=on_row_done,
+            deadline=time.monotonic() + JOB_DEADLINE_SECONDS,
+            hedge_budget=openai_client.new_hedge_budget()
+        )
+        try:
+            pipeline.run(checkpointed(job_batches()))
+            report.close()
+        except Exception:
+            report.abort()
+            raise
+        queries_count = ingest["rows_total"]
+        stats = pipeline.stats
+        publish_stage("search", started, **stats)
+        print(
+            f"Итоги обработки {job_id}: строк {stats['rows']} (из чекпоинта {stats['resumed_rows']}), "
+            f"запросов к API {stats['api_calls']}, экономия {stats['api_call_reduction']:.0%}, "
+            f"кэш: попаданий {stats['cache_hits']}, промахов {stats['cache_misses']}, "
+            f"повторов {stats['retries']}, ошибок {stats['errors']}"
+        )
         
-        # Конвертация в CSV
-        csv_buffer = BytesIO()
-        report_df.to_csv(csv_buffer, index=False, encoding='utf-8')
-        csv_content = csv_buffer.getvalue()
+        with open(report_path, "rb") as report_file:
+            report_content = report_file.read()
 
         # Сохранение email в БД
-        db.save_email(email, client_ip)
+        db.save_email(job["email"], job["ip"], job.get("country") or "")
 
         # Отправка email
+        started = time.monotonic()
         email_service.send_report_email(
-            recipient_email=email,
-            csv_content=csv_content,
-            queries_count=queries_count
+            recipient_email=job["email"],
+            report_content=report_content,
+            queries_count=queries_count,
+            file_format=REPORT_FORMAT
         )
+        publish_stage("email", started)
         
+    except CircuitOpenError as e:
+        # OpenAI недоступен: задача ждет в очереди без расхода попытки, готовые строки сохранены
+        raise JobPostponedError(str(e), e.retry_after) from e
+    except JobPostponedError:
+        # Попытка не засчитывается - файл еще понадобится
+        raise
     except Exception as e:
         print(f"❌ Ошибка в worker-потоке: {e}")
-    finally:
-        # Удаляем временный файл
-        if os.path.exists(file_path):
+        # На последней попытке (или при неустранимой ошибке) файл больше не понадобится
+        final = isinstance(e, JobFailedError) or job["attempts"] >= JOB_MAX_ATTEMPTS
+        if final and os.path.exists(file_path):
             os.remove(file_path)
-            print(f"Временный файл {file_path} удален.")
+        raise
+    finally:
+        if os.path.exists(report_path):
+            os.remove(report_path)
+
+async def spool_upload(request: Request, max_size_mb: int) -> UploadSpooler:
+    """
+    Потоковое сохранение загрузки в UPLOAD_DIR
+    
+    Тело читается из request.stream() и разбирается по мере поступления: файл
+    хешируется и пишется на диск блоками, чтение прерывается, как только файл
+    превысил max_size_mb. Хеширование и запись идут в пуле потоков anyio (как
+    в UploadFile Starlette), чтобы не задерживать цикл событий.
+    
+    Args:
+        request: Запрос с телом multipart/form-data (поля file и email)
+        max_size_mb: Максимальный размер в МБ
+        
+    Returns:
+        UploadSpooler с путем к временному файлу, хешем, размером и полями формы
+        
+    Raises:
+        ValueError: Если размер превышает max_size_mb (временный файл удаляется)
+        UploadFormError: Если тело не является формой с файлом
+    """
+    spooler = UploadSpooler(request.headers.get("content-type", ""), max_size_mb, UPLOAD_FORM_OVERHEAD)
+    try:
+        async for chunk in request.stream():
+            await anyio.to_thread.run_sync(spooler.write, chunk)
+        await anyio.to_thread.run_sync(spooler.finish)
+    except Exception:
+        await anyio.to_thread.run_sync(spooler.discard)
+        raise
+    return spooler
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """
+    Форматирование события Server-Sent Events
+    """
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+def rate_limited_response(retry_after: float) -> JSONResponse:
+    """
+    Ответ 429 с заголовком Retry-After (в целых секундах)
+    """
+    return JSONResponse(
+        {"detail": "Забагато запитів. Спробуйте пізніше"},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+def check_admin_token(request: Request) -> None:
+    """
+    Проверка токена администратора (Authorization: Bearer <токен> или X-Admin-Token)
+    
+    Raises:
+        HTTPException: 403, если ADMIN_TOKEN не задан; 401, если токен не передан или неверный
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Доступ заборонено")
+    
+    token = request.headers.get("X-Admin-Token", "")
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[len("bearer "):].strip()
+    if not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Невірний токен доступу", headers={"WWW-Authenticate": "Bearer"})
+
+def get_client_country(request: Request) -> str:
+    """
+    Код страны клиента из заголовка Vercel (пустая строка, если неизвестна)
+    """
+    country = request.headers.get("X-Vercel-IP-Country", "").strip().upper()
+    return country if len(country) == 2 and country.isalpha() else ""
 
 def get_client_ip(request: Request) -> str:
     """
@@ -2,10 +2,34 @@
 Расчет метрик для AI Visibility отчета с поддержкой индивидуальных доменов
 """
 
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, NamedTuple
 from urllib.parse import urlparse
 from collections import Counter
 
+# Порядок колонок отчета, совпадает с ключами calculate_metrics_for_query
+REPORT_COLUMNS: List[str] = [
+    "Страна",
+    "Целевой домен",
+    "Рекомендація АІ",
+    "Позиція",
+    "Best Rank Explanation",
+    "AIV-Score",
+    "AIV-Score Level",
+    "Mentions Count",
+    "Конкуренти",
+    "Competitor Strength Index",
+    "Competitor Strength Label",
+    "Coverage Type",
+    "Total Sources",
+    "Помилка"
+]
+
+class SourceRecord(NamedTuple):
+    """Источник, разобранный один раз: домен, позиция (с 1) и тип покрытия"""
+    domain: str
+    rank: int
+    coverage: str
+
 class MetricsCalculator:
     """Класс для расчета метрик AI Visibility"""
     
@@ -39,11 +63,6 @@ class MetricsCalculator:
             AIV-Score от 0 до 100
         """
         target_domain = target_domain.lower()
-        N = len(sources)
-        K = min(5, max(1, N)) if N > 0 else 1
-        
-        # 40% Inclusion - есть ли вообще источники
-        inclusion = 1.0 if N > 0 else 0.0
         
         # Поиск рангов целевого домена
         our_ranks = [
@@ -51,6 +70,25 @@ class MetricsCalculator:
             if MetricsCalculator.extract_domain(source.get("url", "")) == target_domain
         ]
         
+        return MetricsCalculator.aiv_score_from_ranks(our_ranks, len(sources))
+    
+    @staticmethod
+    def aiv_score_from_ranks(our_ranks: List[int], N: int) -> float:
+        """
+        Расчет AIV-Score по рангам целевого домена
+        
+        Args:
+            our_ranks: Позиции целевого домена (с 1)
+            N: Общее количество источников
+            
+        Returns:
+            AIV-Score от 0 до 100
+        """
+        K = min(5, max(1, N)) if N > 0 else 1
+        
+        # 40% Inclusion - есть ли вообще источники
+        inclusion = 1.0 if N > 0 else 0.0
+        
         # 40% Presence × Prominence - есть ли мы и насколько высоко
         presence = 1.0 if our_ranks else 0.0
         prominence = (1.0 - (min(our_ranks) - 1) / K) if our_ranks else 0.0
@@ -106,6 +144,19 @@ class MetricsCalculator:
                 if len(competitor_ranks) >= k:
                     break
         
+        return MetricsCalculator.competitor_strength_from_ranks(competitor_ranks)
+    
+    @staticmethod
+    def competitor_strength_from_ranks(competitor_ranks: List[int]) -> Tuple[Optional[float], str]:
+        """
+        Индекс силы конкурентов по их позициям
+        
+        Args:
+            competitor_ranks: Позиции первых конкурентов (с 1)
+            
+        Returns:
+            Tuple[индекс силы, текстовое описание]
+        """
         if not competitor_ranks:
             return None, "No competitors"
         
@@ -134,19 +185,37 @@ class MetricsCalculator:
         if not sources:
             return "N/A"
         
-        types = []
-        for source in sources:
-            url = source.get("url", "").lower()
-            if any(keyword in url for keyword in ["forum", "reddit", "quora"]):
-                types.append("Forum")
-            elif any(keyword in url for keyword in ["/docs", "/help"]):
-                types.append("Docs")
-            elif any(keyword in url for keyword in ["/product", "/buy", "/shop"]):
-                types.append("Product")
-            elif any(keyword in url for keyword in ["/blog", "/review"]):
-                types.append("Blog")
-            else:
-                types.append("Other")
+        types = [MetricsCalculator.classify_coverage(source.get("url", "")) for source in sources]
+        return MetricsCalculator.coverage_summary(types)
+    
+    @staticmethod
+    def classify_coverage(url: str) -> str:
+        """Тип источника по ключевым словам в URL"""
+        url = url.lower()
+        if any(keyword in url for keyword in ["forum", "reddit", "quora"]):
+            return "Forum"
+        elif any(keyword in url for keyword in ["/docs", "/help"]):
+            return "Docs"
+        elif any(keyword in url for keyword in ["/product", "/buy", "/shop"]):
+            return "Product"
+        elif any(keyword in url for keyword in ["/blog", "/review"]):
+            return "Blog"
+        else:
+            return "Other"
+    
+    @staticmethod
+    def coverage_summary(types: List[str]) -> str:
+        """
+        Два самых частых типа источников с долями
+        
+        Args:
+            types: Типы источников в порядке выдачи
+            
+        Returns:
+            Строка с описанием типов источников
+        """
+        if not types:
+            return "N/A"
         
         # Подсчет статистики
         counter = Counter(types)
@@ -171,29 +240,69 @@ class MetricsCalculator:
         Returns:
             Словарь с метриками
         """
-        target_domain = target_domain.lower()
+        return MetricsCalculator.calculate_metrics_from_records(
+            MetricsCalculator.parse_sources(sources), target_domain, country
+        )
+    
+    @staticmethod
+    def parse_sources(sources: List[Dict]) -> List[SourceRecord]:
+        """
+        Однократный разбор источников: домен и тип покрытия для каждого URL
         
-        # Подсчет упоминаний целевого домена
-        our_mentions = 0
-        best_rank = None
+        Args:
+            sources: Список источников из ответа OpenAI
+            
+        Returns:
+            Список SourceRecord в порядке выдачи
+        """
+        records = []
+        for rank, source in enumerate(sources, 1):
+            url = source.get("url", "")
+            records.append(SourceRecord(
+                domain=MetricsCalculator.extract_domain(url),
+                rank=rank,
+                coverage=MetricsCalculator.classify_coverage(url)
+            ))
+        return records
+    
+    @staticmethod
+    def calculate_metrics_from_records(records: List[SourceRecord], target_domain: str,
+                                       country: str = "") -> Dict[str, Any]:
+        """
+        Расчет всех метрик за один проход по разобранным источникам
         
-        for i, source in enumerate(sources, 1):
-            domain = MetricsCalculator.extract_domain(source.get("url", ""))
-            if domain == target_domain:
-                our_mentions += 1
-                if best_rank is None:
-                    best_rank = i
+        Результат совпадает с calculate_metrics_for_query, но URL не разбираются
+        повторно: записи из parse_sources можно переиспользовать для нескольких
+        целевых доменов одного запроса.
         
-        # Расчет всех метрик
-        aiv_score = MetricsCalculator.calculate_aiv_score(sources, target_domain)
-        competitor_index, competitor_label = MetricsCalculator.calculate_competitor_strength(sources, target_domain)
+        Args:
+            records: Результат parse_sources
+            target_domain: Целевой домен для анализа
+            country: Страна запроса (для дополнительного контекста)
+            
+        Returns:
+            Словарь с метриками в порядке REPORT_COLUMNS
+        """
+        target_domain = target_domain.lower()
         
-        # Список конкурентов (исключая наш домен)
+        our_ranks = []
+        competitor_ranks = []
         competitors = []
-        for source in sources[:5]:  # Берем первые 5
-            domain = MetricsCalculator.extract_domain(source.get("url", ""))
-            if domain and domain != target_domain and domain not in competitors:
-                competitors.append(domain)
+        
+        for domain, rank, _ in records:
+            if domain == target_domain:
+                our_ranks.append(rank)
+            elif domain:
+                if len(competitor_ranks) < 3:
+                    competitor_ranks.append(rank)
+                # Список конкурентов берется из первых 5 источников
+                if rank <= 5 and domain not in competitors:
+                    competitors.append(domain)
+        
+        our_mentions = len(our_ranks)
+        best_rank = our_ranks[0] if our_ranks else None
+        aiv_score = MetricsCalculator.aiv_score_from_ranks(our_ranks, len(records))
+        competitor_index, competitor_label = MetricsCalculator.competitor_strength_from_ranks(competitor_ranks)
         
         return {
             "Страна": country,
@@ -210,6 +319,32 @@ class MetricsCalculator:
             "Конкуренти": ", ".join(competitors[:3]),  # Показываем топ-3 конкурентов
             "Competitor Strength Index": competitor_index,
             "Competitor Strength Label": competitor_label,
-            "Coverage Type": MetricsCalculator.analyze_coverage_type(sources),
-            "Total Sources": len(sources)
-        }
\ No newline at end of file
+            "Coverage Type": MetricsCalculator.coverage_summary([record.coverage for record in records]),
+            "Total Sources": len(records),
+            "Помилка": ""
+        }
+    
+    @staticmethod
+    def failed_metrics(target_domain: str, country: str, error: str) -> Dict[str, Any]:
+        """
+        Строка отчета для запроса, на который не удалось получить ответ
+        
+        Метрики остаются пустыми, а не нулевыми: иначе строку нельзя отличить от
+        домена, который ИИ действительно не рекомендует. Причина - в колонке "Помилка".
+        
+        Args:
+            target_domain: Целевой домен
+            country: Страна запроса
+            error: Описание ошибки
+            
+        Returns:
+            Словарь в порядке REPORT_COLUMNS
+        """
+        metrics_data: Dict[str, Any] = {column: "" for column in REPORT_COLUMNS}
+        metrics_data.update({
+            "Страна": country,
+            "Целевой домен": target_domain.lower(),
+            "Рекомендація АІ": "Немає даних",
+            "Помилка": error
+        })
+        return metrics_data
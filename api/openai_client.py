@@ -2,9 +2,43 @@
 Клиент для работы с OpenAI Responses API
 """
 
+import re
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from email.utils import parsedate_to_datetime
 from typing import Dict, List, Any, Optional
+import openai
 from openai import OpenAI
-from config import OPENAI_API_KEY, OPENAI_MODEL, OPENAI_TIMEOUT
+from config import (
+    OPENAI_API_KEY, OPENAI_MODEL, OPENAI_TIMEOUT, OPENAI_CONCURRENCY,
+    OPENAI_MAX_ATTEMPTS, OPENAI_BACKOFF_BASE_SECONDS, OPENAI_BACKOFF_MAX_SECONDS,
+    OPENAI_RPM, OPENAI_TPM, OPENAI_TOKENS_ESTIMATE, OPENAI_ADAPTIVE_CONCURRENCY, OPENAI_HEDGE_ENABLED, JOB_WORKERS,
+    OPENAI_BREAKER_ENABLED
+)
+from response_cache import response_cache
+from rate_limit import UsageLimiter
+from concurrency_limit import AdaptiveConcurrencyLimiter
+from hedge import LatencyTracker, HedgeBudget
+from circuit_breaker import CircuitBreaker
+
+# HTTP статусы, после которых запрос имеет смысл повторить
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+# Длительности в заголовках x-ratelimit-reset-*: "1s", "6m0s", "20ms"
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+class SearchUnavailableError(Exception):
+    """Временная ошибка OpenAI, не устраненная повторами (задачу стоит повторить позже)"""
+
+class CircuitOpenError(SearchUnavailableError):
+    """Circuit breaker открыт: запросы к OpenAI не отправляются"""
+    
+    def __init__(self, retry_after: float):
+        super().__init__(f"OpenAI недоступен, повтор через {retry_after:.0f} с")
+        self.retry_after = retry_after
 
 class OpenAIClient:
     """Клиент для OpenAI Responses API"""
@@ -13,46 +47,434 @@ class OpenAIClient:
         if not OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY не установлен")
         
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+        # Повторы выполняются здесь (с учетом дедлайна задачи), а не внутри SDK
+        self.client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
         self.model = OPENAI_MODEL
         self.timeout = OPENAI_TIMEOUT
+        self.cache = response_cache
+        self.max_attempts = max(1, OPENAI_MAX_ATTEMPTS)
+        self.backoff_base = OPENAI_BACKOFF_BASE_SECONDS
+        self.backoff_max = OPENAI_BACKOFF_MAX_SECONDS
+        self.retries = 0
+        self.failures = 0
+        self.cache_errors = 0
+        self._lock = threading.Lock()
+        # Общий для всех воркеров процесса лимит RPM/TPM аккаунта
+        self.usage_limiter = (
+            UsageLimiter(OPENAI_RPM, OPENAI_TPM, OPENAI_TOKENS_ESTIMATE)
+            if OPENAI_RPM > 0 or OPENAI_TPM > 0 else None
+        )
+        # Общий адаптивный лимит одновременных запросов (AIMD)
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter() if OPENAI_ADAPTIVE_CONCURRENCY else None
+        # Хеджирование: запросы идут в отдельных потоках, чтобы дождаться первого из двух ответов
+        self.hedge_latency = LatencyTracker() if OPENAI_HEDGE_ENABLED else None
+        self.hedge_executor = (
+            ThreadPoolExecutor(max_workers=4 * JOB_WORKERS * self.max_concurrency, thread_name_prefix="openai-hedge")
+            if OPENAI_HEDGE_ENABLED else None
+        )
+        self.hedges = 0
+        self.hedge_wins = 0
+        # Быстрый отказ вместо ожидания таймаутов, пока OpenAI недоступен
+        self.circuit_breaker = CircuitBreaker() if OPENAI_BREAKER_ENABLED else None
     
-    def search_with_web(self, query: str) -> Dict[str, Any]:
+    def search_with_web(self, query: str, country: str = "", deadline: Optional[float] = None,
+                        hedge_budget: Optional[HedgeBudget] = None) -> Dict[str, Any]:
         """
         Выполнение запроса к OpenAI с веб-поиском
         
+        Временные ошибки (429, 5xx, таймауты, обрывы соединения) повторяются до
+        max_attempts раз с экспоненциальной задержкой со случайным разбросом;
+        Retry-After и x-ratelimit-reset-* из ответа учитываются. Повторы не
+        выходят за deadline задачи. Перед каждой попыткой вызов ждет, пока запрос
+        укладывается в лимиты RPM/TPM аккаунта и в адаптивный лимит одновременных
+        запросов. Если включено хеджирование и передан бюджет задачи, попытка без
+        ответа дольше p95 задержки дублируется (см. call_hedged). Пока circuit
+        breaker открыт, запросы не отправляются.
+        
         Args:
             query: Поисковый запрос
+            country: Страна запроса (часть ключа кэша)
+            deadline: Крайний срок по time.monotonic() (None - без ограничения)
+            hedge_budget: Бюджет дублей задачи (None - без хеджирования)
             
         Returns:
-            Dict с источниками, usage и query
+            Dict с источниками, usage, query, признаком cached и числом попыток attempts;
+            при ошибке - error, retryable (ошибка временная) и deadline_exceeded (запрос
+            не выполнен, потому что истек deadline)
+        
+        Raises:
+            CircuitOpenError: Если circuit breaker открыт (ответа из кэша нет)
         """
-        try:
-            response = self.client.responses.create(
-                model=self.model,
-                input=f"{query} briefly and include sources citations.",
-                tools=[{"type": "websearch"}],
-                timeout=self.timeout
-            )
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(self.model, query, country)
+            try:
+                cached = self.cache.get(cache_key)
+            except Exception as e:
+                # Сбой кэша (блокировка, поврежденная запись) - это промах, а не ошибка запроса
+                print(f"Ошибка чтения кэша: {e}")
+                self.count_cache_error()
+                cached = None
+            if cached is not None:
+                return {
+                    "sources": cached["sources"],
+                    "usage": cached["usage"],
+                    "query": query,
+                    "cached": True
+                }
+        
+        attempts = 0
+        while True:
+            attempts += 1
+            permit = None
+            if self.circuit_breaker is not None:
+                permit = self.circuit_breaker.allow()
+                if permit is None:
+                    raise CircuitOpenError(self.circuit_breaker.retry_after())
+            
+            reserved = None
+            if self.usage_limiter is not None:
+                reserved = self.usage_limiter.acquire(deadline)
+                if reserved is None:
+                    self.record_breaker("neutral", permit)
+                    return self.error_result(query, "Лимит запросов OpenAI не позволяет уложиться в срок задачи",
+                                             True, attempts - 1, deadline_exceeded=True)
+            
+            timeout = self.timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.release_usage(reserved)
+                    self.record_breaker("neutral", permit)
+                    return self.error_result(query, "Превышен срок выполнения задачи", True, attempts - 1,
+                                             deadline_exceeded=True)
+                timeout = min(timeout, remaining)
+            
+            started = None
+            if self.concurrency_limiter is not None:
+                started = self.concurrency_limiter.acquire(deadline)
+                if started is None:
+                    self.release_usage(reserved)
+                    self.record_breaker("neutral", permit)
+                    return self.error_result(query, "Нет свободного слота для запроса до срока задачи",
+                                             True, attempts - 1, deadline_exceeded=True)
+            
+            try:
+                if hedge_budget is not None and self.hedge_executor is not None:
+                    response = self.call_hedged(query, timeout, started, reserved, permit, hedge_budget)
+                else:
+                    response = self.call_once(query, timeout, started, reserved, permit)
+            except Exception as e:
+                retryable = self.is_retryable(e)
+                print(f"Ошибка OpenAI API (попытка {attempts}): {e}")
+                delay = self.retry_delay(attempts, e)
+                out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+                if not retryable or attempts >= self.max_attempts or out_of_time:
+                    # Повтор был возможен, но не укладывается в срок - это истечение срока, а не отказ
+                    return self.error_result(query, str(e), retryable, attempts,
+                                             deadline_exceeded=retryable and attempts < self.max_attempts)
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                continue
             
             # Извлечение источников из ответа
             sources = self.extract_sources(response)
-            usage = getattr(response, "usage", None)
+            usage = self.usage_to_dict(getattr(response, "usage", None))
+            
+            if cache_key is not None:
+                try:
+                    self.cache.set(cache_key, sources, usage)
+                except Exception as e:
+                    print(f"Ошибка записи в кэш: {e}")
+                    self.count_cache_error()
             
             return {
                 "sources": sources,
                 "usage": usage,
-                "query": query
+                "query": query,
+                "cached": False,
+                "attempts": attempts
             }
+    
+    def call_once(self, query: str, timeout: float, started: Optional[float], reserved: Optional[float],
+                  permit: Optional[int]):
+        """
+        Один запрос к Responses API с освобождением слота и учетом токенов
+        
+        Args:
+            query: Поисковый запрос
+            timeout: Таймаут запроса в секундах
+            started: Результат acquire адаптивного лимита (None - лимит выключен)
+            reserved: Резерв токенов UsageLimiter (None - лимит выключен)
+            permit: Разрешение circuit breaker (None - breaker выключен)
             
+        Returns:
+            Ответ OpenAI; ошибки SDK пробрасываются
+        """
+        call_started = time.monotonic()
+        try:
+            response = self.client.responses.create(
+                model=self.model,
+                input=f"{query} briefly and include sources citations.",
+                tools=[{"type": "websearch"}],
+                timeout=timeout
+            )
         except Exception as e:
-            print(f"Ошибка OpenAI API: {e}")
-            return {
-                "sources": [],
-                "usage": None,
-                "query": query,
-                "error": str(e)
-            }
+            self.release_slot(started, "throttled" if self.is_throttling(e) else "error")
+            self.record_breaker("failure" if self.is_outage(e) else "neutral", permit)
+            raise
+        
+        self.release_slot(started, "ok")
+        self.record_breaker("ok", permit)
+        if self.hedge_latency is not None:
+            self.hedge_latency.record(time.monotonic() - call_started)
+        if self.usage_limiter is not None:
+            usage = self.usage_to_dict(getattr(response, "usage", None))
+            self.usage_limiter.record_usage(reserved, self.total_tokens(usage))
+        return response
+    
+    def call_hedged(self, query: str, timeout: float, started: Optional[float], reserved: Optional[float],
+                    permit: Optional[int], hedge_budget: HedgeBudget):
+        """
+        Запрос с дублем: если ответа нет дольше p95 задержки, отправляется второй
+        такой же запрос, и используется первый успешный ответ
+        
+        Дубль отправляется, только если его разрешают бюджет задачи, адаптивный
+        лимит и лимиты RPM/TPM без ожидания - хеджирование не добавляет нагрузки,
+        когда сервер и так перегружен. Синхронный вызов SDK нельзя прервать,
+        поэтому проигравший запрос дорабатывает в своем потоке (слот и токены
+        учитываются как обычно), а его ответ отбрасывается.
+        
+        Args:
+            query: Поисковый запрос
+            timeout: Таймаут запроса в секундах
+            started: Результат acquire адаптивного лимита для основного запроса
+            reserved: Резерв токенов для основного запроса
+            permit: Разрешение circuit breaker для основного запроса
+            hedge_budget: Бюджет дублей задачи
+            
+        Returns:
+            Ответ OpenAI; если оба запроса завершились ошибкой, пробрасывается ошибка основного
+        """
+        hedge_budget.note_call()
+        call_started = time.monotonic()
+        primary = self.hedge_executor.submit(self.call_once, query, timeout, started, reserved, permit)
+        done, _ = wait([primary], timeout=self.hedge_latency.delay())
+        if done:
+            return primary.result()
+        
+        remaining = timeout - (time.monotonic() - call_started)
+        hedge = self.start_hedge(query, remaining, hedge_budget) if remaining > 0 else None
+        if hedge is None:
+            return primary.result()
+        
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+        return primary.result()
+    
+    def start_hedge(self, query: str, timeout: float, hedge_budget: HedgeBudget):
+        """Отправка дубля запроса без ожидания лимитов (None - дубль не разрешен)"""
+        permit = None
+        if self.circuit_breaker is not None:
+            permit = self.circuit_breaker.closed_permit()
+            if permit is None:
+                return None
+        if not hedge_budget.try_spend():
+            return None
+        now = time.monotonic()
+        started = None
+        if self.concurrency_limiter is not None:
+            started = self.concurrency_limiter.acquire(now)
+            if started is None:
+                hedge_budget.refund()
+                return None
+        reserved = None
+        if self.usage_limiter is not None:
+            reserved = self.usage_limiter.acquire(now)
+            if reserved is None:
+                self.release_slot(started, "cancelled")
+                hedge_budget.refund()
+                return None
+        
+        with self._lock:
+            self.hedges += 1
+        return self.hedge_executor.submit(self.call_once, query, timeout, started, reserved, permit)
+    
+    def new_hedge_budget(self) -> Optional[HedgeBudget]:
+        """Бюджет дублей для новой задачи (None, если хеджирование выключено)"""
+        return HedgeBudget() if self.hedge_executor is not None else None
+    
+    def error_result(self, query: str, error: str, retryable: bool, attempts: int,
+                     deadline_exceeded: bool = False) -> Dict[str, Any]:
+        """Ответ при неустранимой ошибке: пустые источники и описание ошибки"""
+        with self._lock:
+            self.failures += 1
+        return {
+            "sources": [],
+            "usage": None,
+            "query": query,
+            "cached": False,
+            "attempts": attempts,
+            "error": error,
+            "retryable": retryable,
+            "deadline_exceeded": deadline_exceeded
+        }
+    
+    def release_slot(self, started: Optional[float], outcome: str) -> None:
+        """Освобождение слота адаптивного лимита (если он включен)"""
+        if started is not None:
+            self.concurrency_limiter.release(started, outcome)
+    
+    def release_usage(self, reserved: Optional[float]) -> None:
+        """Возврат резерва RPM/TPM неотправленного запроса (если лимит включен)"""
+        if reserved is not None:
+            self.usage_limiter.release(reserved)
+    
+    def count_cache_error(self) -> None:
+        """Учет сбоя кэша (запрос при этом идет в OpenAI)"""
+        with self._lock:
+            self.cache_errors += 1
+    
+    def record_breaker(self, outcome: str, permit: Optional[int]) -> None:
+        """Результат попытки для circuit breaker (если он включен)"""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(outcome, permit)
+    
+    @staticmethod
+    def is_outage(error: Exception) -> bool:
+        """Признак недоступности сервиса: таймаут, обрыв соединения или 5xx"""
+        if isinstance(error, openai.APIConnectionError):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+    
+    @staticmethod
+    def is_throttling(error: Exception) -> bool:
+        """Признак перегрузки: 429 или таймаут - сигнал снизить параллельность"""
+        return isinstance(error, (openai.RateLimitError, openai.APITimeoutError))
+    
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """Временная ли ошибка: таймаут, обрыв соединения, 429 (кроме исчерпанной квоты) или 5xx"""
+        if isinstance(error, openai.APIConnectionError):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            if getattr(error, "code", None) == "insufficient_quota":
+                return False
+            return error.status_code in RETRYABLE_STATUS_CODES
+        return False
+    
+    @staticmethod
+    def retry_after_seconds(error: Exception) -> Optional[float]:
+        """
+        Пауза, которую просит сервер: retry-after-ms или retry-after, а для 429 без
+        них - x-ratelimit-reset-* того лимита (запросов или токенов), который исчерпан
+        
+        x-ratelimit-reset-* - время до полного восстановления лимита, поэтому для
+        5xx и обрывов соединения они не используются.
+        
+        Returns:
+            Секунды или None, если подсказки нет
+        """
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            value = headers.get("retry-after")
+            if value:
+                try:
+                    return float(value)
+                except ValueError:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+        
+        if getattr(error, "status_code", None) != 429:
+            return None
+        
+        # Исчерпанный лимит: remaining-* равен нулю, иначе - по тексту ошибки (... per min (RPM/TPM))
+        exhausted = [
+            limit for limit in ("requests", "tokens")
+            if (headers.get(f"x-ratelimit-remaining-{limit}") or "").strip() == "0"
+        ]
+        if not exhausted:
+            message = str(error).lower()
+            exhausted = [limit for limit in ("requests", "tokens") if f"{limit} per min" in message]
+        
+        resets = []
+        for limit in exhausted:
+            parts = DURATION_PART.findall(headers.get(f"x-ratelimit-reset-{limit}") or "")
+            if parts:
+                resets.append(sum(float(number) * DURATION_UNITS[unit] for number, unit in parts))
+        return max(resets) if resets else None
+    
+    def retry_delay(self, attempt: int, error: Exception) -> float:
+        """
+        Задержка перед следующей попыткой
+        
+        Экспоненциальная задержка с полным случайным разбросом (full jitter), но не
+        меньше паузы, указанной сервером.
+        
+        Args:
+            attempt: Номер неудавшейся попытки (с 1)
+            error: Ошибка попытки
+        """
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        hint = self.retry_after_seconds(error)
+        return max(backoff, hint) if hint is not None else backoff
+    
+    @property
+    def max_concurrency(self) -> int:
+        """Сколько запросов имеет смысл держать в работе (потоков пайплайна на задачу)"""
+        if self.concurrency_limiter is not None:
+            return int(self.concurrency_limiter.max_limit)
+        return OPENAI_CONCURRENCY
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики клиента для /metrics"""
+        with self._lock:
+            stats = {"retries": self.retries, "failures": self.failures, "cache_errors": self.cache_errors}
+        stats["usage_limiter"] = self.usage_limiter.get_stats() if self.usage_limiter is not None else None
+        stats["concurrency"] = self.concurrency_limiter.get_stats() if self.concurrency_limiter is not None else None
+        if self.hedge_latency is not None:
+            with self._lock:
+                stats["hedging"] = {"hedges": self.hedges, "wins": self.hedge_wins}
+            stats["hedging"].update(self.hedge_latency.get_stats())
+        else:
+            stats["hedging"] = None
+        stats["circuit_breaker"] = self.circuit_breaker.get_stats() if self.circuit_breaker is not None else None
+        return stats
+    
+    @staticmethod
+    def usage_to_dict(usage) -> Optional[Dict[str, Any]]:
+        """Приведение usage ответа к словарю (для кэша и подсчета токенов)"""
+        if usage is None:
+            return None
+        if hasattr(usage, "model_dump"):
+            return usage.model_dump()
+        if isinstance(usage, dict):
+            return usage
+        return dict(getattr(usage, "__dict__", {}))
+    
+    @staticmethod
+    def total_tokens(usage: Optional[Dict[str, Any]]) -> Optional[int]:
+        """Токены ответа из usage (None, если usage нет)"""
+        if not usage:
+            return None
+        if usage.get("total_tokens") is not None:
+            return usage["total_tokens"]
+        return (usage.get("input_tokens") or 0) + (usage.get("output_tokens") or 0)
     
     def extract_sources(self, response) -> List[Dict[str, Any]]:
         """
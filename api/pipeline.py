@@ -0,0 +1,144 @@
+"""
+Параллельное выполнение запросов к OpenAI для строк загруженного файла
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Tuple, Callable, Optional, Iterable
+from config import OPENAI_CONCURRENCY
+from metrics import MetricsCalculator
+
+# Колбэк завершения строки: (строка, ответ search_with_web, метрики)
+RowCallback = Callable[[Dict[str, Any], Dict[str, Any], Dict[str, Any]], None]
+
+class QueryPipeline:
+    """Выполнение запросов с ограниченной параллельностью"""
+    
+    def __init__(self, client, concurrency: int = OPENAI_CONCURRENCY,
+                 on_row_done: Optional[RowCallback] = None, deadline: Optional[float] = None,
+                 hedge_budget=None):
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.on_row_done = on_row_done
+        self.deadline = deadline
+        self.hedge_budget = hedge_budget
+        self.stats: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def normalize_text(value: Any) -> str:
+        """Нормализация текста для группировки: регистр и лишние пробелы"""
+        return " ".join(str(value).split()).casefold()
+    
+    @staticmethod
+    def plan(rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Группировка строк по нормализованной паре (Prompt, Country)
+        
+        Args:
+            rows: Строки, которые нужно обработать
+            
+        Returns:
+            Список групп строк, в порядке первого появления
+        """
+        groups: "OrderedDict[Tuple[str, str], List[Dict[str, Any]]]" = OrderedDict()
+        for row in rows:
+            key = (
+                QueryPipeline.normalize_text(row['Prompt']),
+                QueryPipeline.normalize_text(row['Country'])
+            )
+            groups.setdefault(key, []).append(row)
+        return list(groups.values())
+    
+    def process_group(self, group: List[Dict[str, Any]]) -> None:
+        """
+        Один запрос к OpenAI на группу и расчет метрик для каждого целевого домена
+        
+        Args:
+            group: Строки группы с одинаковыми Prompt и Country
+        """
+        first = group[0]
+        started = time.monotonic()
+        response_data = self.client.search_with_web(
+            first['Prompt'], first['Country'], deadline=self.deadline, hedge_budget=self.hedge_budget
+        )
+        response_data['latency_ms'] = round((time.monotonic() - started) * 1000)
+        sources = response_data['sources']
+        
+        with self._lock:
+            counter = 'cache_hits' if response_data.get('cached') else 'cache_misses'
+            self.stats[counter] += 1
+            self.stats['retries'] += max(0, response_data.get('attempts', 1) - 1)
+            if 'error' in response_data:
+                self.stats['errors'] += 1
+        
+        # Источники разбираются один раз на группу, метрики - один раз на домен
+        records = MetricsCalculator.parse_sources(sources)
+        by_domain: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for row in group:
+            key = (row['target_domain'], row['Country'])
+            if key not in by_domain:
+                if 'error' in response_data:
+                    # Без ответа метрики не считаются: строка помечается ошибкой, а не нулевым AIV-Score
+                    by_domain[key] = MetricsCalculator.failed_metrics(
+                        row['target_domain'], row['Country'], response_data['error']
+                    )
+                else:
+                    by_domain[key] = MetricsCalculator.calculate_metrics_from_records(
+                        records=records,
+                        target_domain=row['target_domain'],
+                        country=row['Country']
+                    )
+            if self.on_row_done is not None:
+                self.on_row_done(row, response_data, dict(by_domain[key]))
+    
+    def run(self, batches: Iterable[List[Dict[str, Any]]]) -> None:
+        """
+        Обработка строк файла, поступающих блоками
+        
+        Группы из блока отправляются в пул сразу, поэтому запросы к OpenAI идут,
+        пока следующие блоки еще читаются. Число групп в работе ограничено, чтобы
+        память не росла вместе с размером файла. Метрики не накапливаются:
+        каждая строка передается в on_row_done сразу после расчета (порядок
+        завершения произвольный). Повторы Prompt/Country объединяются в пределах
+        блока; между блоками их покрывает кэш ответов.
+        
+        Args:
+            batches: Блоки строк с колонками Country, Prompt, target_domain; строки с уже
+                заполненным ключом metrics (чекпоинт) повторно не запрашиваются
+        """
+        self.stats = {
+            "cache_hits": 0, "cache_misses": 0, "rows": 0, "resumed_rows": 0, "api_calls": 0,
+            "retries": 0, "errors": 0
+        }
+        max_in_flight = self.concurrency * 2
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            in_flight = set()
+            try:
+                for rows in batches:
+                    pending = [row for row in rows if not row.get('metrics')]
+                    groups = self.plan(pending)
+                    self.stats["rows"] += len(rows)
+                    self.stats["resumed_rows"] += len(rows) - len(pending)
+                    self.stats["api_calls"] += len(groups)
+                    
+                    for group in groups:
+                        while len(in_flight) >= max_in_flight:
+                            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                future.result()
+                        in_flight.add(executor.submit(self.process_group, group))
+                
+                for future in in_flight:
+                    future.result()
+            except Exception:
+                for future in in_flight:
+                    future.cancel()
+                raise
+        
+        new_rows = self.stats["rows"] - self.stats["resumed_rows"]
+        self.stats["api_call_reduction"] = round(1 - self.stats["api_calls"] / new_rows, 3) if new_rows else 0.0
+        self.stats["hedges"] = self.hedge_budget.spent if self.hedge_budget is not None else 0
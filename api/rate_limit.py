@@ -0,0 +1,246 @@
+"""
+Ограничение частоты запросов в памяти процесса (token bucket)
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_IP_PER_MINUTE, RATE_LIMIT_IP_BURST,
+    RATE_LIMIT_EMAIL_PER_MINUTE, RATE_LIMIT_EMAIL_BURST, RATE_LIMIT_MAX_KEYS
+)
+
+class TokenBucket:
+    """
+    Ведро токенов: пополняется со скоростью rate токенов в секунду до capacity
+    
+    Не потокобезопасно само по себе - блокировку держит владелец.
+    """
+    
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def refill(self, now: float) -> None:
+        """Пополнение токенов за время с последнего обращения"""
+        # now мог быть взят раньше, чем создано ведро: отрицательный интервал не списывает токены
+        if now <= self.updated:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def try_acquire(self, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """
+        Попытка списать cost токенов
+        
+        Args:
+            cost: Количество токенов
+            now: Текущее время time.monotonic() (по умолчанию берется сейчас)
+        
+        Returns:
+            0 если токены списаны, иначе сколько секунд ждать до появления нужного количества
+        """
+        wait = self.wait_time(cost, now)
+        if not wait:
+            self.tokens -= cost
+        return wait
+    
+    def wait_time(self, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """
+        Сколько секунд ждать, пока в ведре будет cost токенов (без списания)
+        
+        Args:
+            cost: Количество токенов
+            now: Текущее время time.monotonic() (по умолчанию берется сейчас)
+        """
+        self.refill(time.monotonic() if now is None else now)
+        if self.tokens >= cost:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (cost - self.tokens) / self.rate
+
+class RateLimiter:
+    """
+    Ведра токенов по ключу (IP, email) с ограниченной памятью
+    
+    Хранится не больше max_keys ведер; при переполнении вытесняется ведро,
+    к которому дольше всего не обращались (LRU). Вытесненный ключ начинает
+    с полного ведра, поэтому max_keys должен покрывать активных клиентов.
+    """
+    
+    def __init__(self, per_minute: float, burst: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def try_acquire(self, key: str, cost: float = 1.0) -> float:
+        """
+        Проверка лимита для ключа
+        
+        Args:
+            key: IP адрес или email
+            cost: Стоимость запроса в токенах
+        
+        Returns:
+            0 если запрос разрешен, иначе рекомендуемый Retry-After в секундах
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+            
+            wait = bucket.try_acquire(cost, now)
+            if wait:
+                self.rejected += 1
+            else:
+                self.allowed += 1
+            return wait
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика лимитера для /metrics"""
+        with self._lock:
+            return {
+                "keys": len(self._buckets),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "evicted": self.evicted
+            }
+
+class UsageLimiter:
+    """
+    Общий на процесс лимит запросов и токенов в минуту (RPM/TPM аккаунта OpenAI)
+    
+    Перед запросом резервируется один запрос и оценка токенов (скользящее среднее
+    фактического usage); после ответа резерв исправляется на фактический расход.
+    Перерасход уходит в минус, и следующие запросы ждут, пока он восстановится.
+    Нулевой лимит отключает соответствующее ведро.
+    """
+    
+    # Всплеск - не весь минутный лимит сразу: сервер считает лимит по коротким интервалам
+    BURST_SECONDS = 10.0
+    
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, tokens_estimate: float):
+        self.requests = self.make_bucket(requests_per_minute, 1.0)
+        self.tokens = self.make_bucket(tokens_per_minute, 0.0)
+        self.tokens_estimate = tokens_estimate
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.released = 0
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def make_bucket(cls, per_minute: float, min_capacity: float) -> Optional[TokenBucket]:
+        """Ведро на per_minute единиц в минуту с запасом на BURST_SECONDS (None если лимита нет)"""
+        if per_minute <= 0:
+            return None
+        rate = per_minute / 60.0
+        return TokenBucket(rate, max(min_capacity, rate * cls.BURST_SECONDS))
+    
+    def acquire(self, deadline: Optional[float] = None) -> Optional[float]:
+        """
+        Ожидание, пока запрос укладывается в лимиты, и резерв под него
+        
+        Args:
+            deadline: Крайний срок по time.monotonic() (None - ждать сколько нужно)
+            
+        Returns:
+            Зарезервированное количество токенов или None, если до deadline не дождаться
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                estimate = self.tokens_estimate
+                if self.tokens is not None:
+                    # Оценка не больше емкости ведра, иначе запрос не пройдет никогда
+                    estimate = min(estimate, self.tokens.capacity)
+                wait = max(
+                    self.requests.wait_time(1, now) if self.requests is not None else 0.0,
+                    self.tokens.wait_time(estimate, now) if self.tokens is not None else 0.0
+                )
+                if not wait:
+                    if self.requests is not None:
+                        self.requests.tokens -= 1
+                    if self.tokens is not None:
+                        self.tokens.tokens -= estimate
+                    if waited:
+                        self.waits += 1
+                        self.wait_seconds += waited
+                    return estimate
+            
+            if deadline is not None and now + wait >= deadline:
+                return None
+            time.sleep(wait)
+            waited += wait
+    
+    def record_usage(self, reserved: float, used_tokens: Optional[int]) -> None:
+        """
+        Исправление резерва на фактический расход токенов из usage ответа
+        
+        Args:
+            reserved: Результат acquire
+            used_tokens: total_tokens ответа (None - usage неизвестен, резерв остается)
+        """
+        if used_tokens is None:
+            return
+        with self._lock:
+            if self.tokens is not None:
+                self.tokens.tokens -= used_tokens - reserved
+            # Скользящее среднее расхода на запрос - оценка для следующих резервов
+            self.tokens_estimate += 0.2 * (used_tokens - self.tokens_estimate)
+    
+    def release(self, reserved: float) -> None:
+        """
+        Возврат резерва запроса, который так и не был отправлен
+        
+        Запрос и токены возвращаются в ведра (не выше емкости); оценка расхода
+        не меняется - ответа, по которому ее можно уточнить, не было.
+        
+        Args:
+            reserved: Результат acquire
+        """
+        with self._lock:
+            now = time.monotonic()
+            for bucket, amount in ((self.requests, 1.0), (self.tokens, reserved)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    bucket.tokens = min(bucket.capacity, bucket.tokens + amount)
+            self.released += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Состояние лимитера для /metrics"""
+        with self._lock:
+            now = time.monotonic()
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.refill(now)
+            return {
+                "requests_available": round(self.requests.tokens, 1) if self.requests is not None else None,
+                "tokens_available": round(self.tokens.tokens) if self.tokens is not None else None,
+                "tokens_estimate": round(self.tokens_estimate),
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "released": self.released
+            }
+
+# Глобальные лимитеры загрузок (None если ограничение выключено)
+ip_rate_limiter = RateLimiter(RATE_LIMIT_IP_PER_MINUTE, RATE_LIMIT_IP_BURST) if RATE_LIMIT_ENABLED else None
+email_rate_limiter = RateLimiter(RATE_LIMIT_EMAIL_PER_MINUTE, RATE_LIMIT_EMAIL_BURST) if RATE_LIMIT_ENABLED else None
@@ -0,0 +1,163 @@
+"""
+Потоковая запись отчета: строки пишутся в файл по мере расчета метрик
+"""
+
+import csv
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List
+from config import FILE_BATCH_SIZE
+from metrics import REPORT_COLUMNS
+
+try:
+    # Опциональный вывод отчета в Parquet
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Числовые колонки отчета в Parquet; остальные - строки
+PARQUET_INT_COLUMNS = ("Позиція", "Mentions Count", "Total Sources")
+PARQUET_FLOAT_COLUMNS = ("AIV-Score", "Competitor Strength Index")
+PARQUET_NUMERIC_COLUMNS = PARQUET_INT_COLUMNS + PARQUET_FLOAT_COLUMNS
+# Колонки с небольшим числом различных значений хранятся словарем
+PARQUET_DICTIONARY_COLUMNS = ("Страна", "Целевой домен")
+
+class ReportWriter(ABC):
+    """
+    Инкрементальная запись отчета в порядке строк входного файла
+    
+    Строки могут приходить не по порядку (параллельные запросы); они держатся
+    в небольшом буфере, пока не будут записаны все предыдущие строки.
+    Наследники реализуют _write_rows и _close_file.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.rows_written = 0
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, index: int, metrics_data: Dict[str, Any]) -> None:
+        """
+        Добавление строки отчета (потокобезопасно)
+        
+        Args:
+            index: Порядковый номер строки во входном файле
+            metrics_data: Результат MetricsCalculator.calculate_metrics_for_query
+        """
+        with self._lock:
+            self._pending[index] = metrics_data
+            ready = []
+            while self.rows_written in self._pending:
+                ready.append(self._pending.pop(self.rows_written))
+                self.rows_written += 1
+            if ready:
+                self._write_rows(ready)
+    
+    def close(self) -> None:
+        """Закрытие файла отчета"""
+        with self._lock:
+            if self._pending:
+                raise ValueError(f"В отчете пропущены строки: ожидается строка {self.rows_written}")
+            self._close_file(complete=True)
+    
+    def abort(self) -> None:
+        """Закрытие файла без проверки полноты (при ошибке задачи)"""
+        with self._lock:
+            self._close_file(complete=False)
+    
+    @abstractmethod
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """Запись очередных строк по порядку (вызывается под блокировкой)"""
+    
+    @abstractmethod
+    def _close_file(self, complete: bool) -> None:
+        """Закрытие файла; complete=False - отчет неполный (задача упала)"""
+
+class CsvReportWriter(ReportWriter):
+    """Отчет в CSV: строки дописываются в файл сразу"""
+    
+    file_format = "csv"
+    
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=REPORT_COLUMNS, lineterminator="\n")
+        self._writer.writeheader()
+    
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self._writer.writerows(rows)
+        self._file.flush()
+    
+    def _close_file(self, complete: bool) -> None:
+        self._file.close()
+
+class ParquetReportWriter(ReportWriter):
+    """
+    Отчет в Parquet: строки копятся и пишутся блоками по FILE_BATCH_SIZE
+    
+    Числовые колонки хранятся числами (пустая позиция - null), страна и домен -
+    словарем, поэтому отчет загружается в колоночные хранилища без разбора CSV.
+    """
+    
+    file_format = "parquet"
+    
+    def __init__(self, path: str, row_group_size: int = FILE_BATCH_SIZE):
+        if pa is None:
+            raise ValueError("Формат отчета parquet не поддерживается: не установлен pyarrow")
+        super().__init__(path)
+        self.row_group_size = row_group_size
+        self._rows: List[Dict[str, Any]] = []
+        self._schema = pa.schema([
+            (column, ParquetReportWriter.column_type(column)) for column in REPORT_COLUMNS
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+    
+    @staticmethod
+    def column_type(column: str):
+        """Тип колонки отчета в Arrow"""
+        if column in PARQUET_INT_COLUMNS:
+            return pa.int64()
+        if column in PARQUET_FLOAT_COLUMNS:
+            return pa.float64()
+        if column in PARQUET_DICTIONARY_COLUMNS:
+            return pa.dictionary(pa.int32(), pa.string())
+        return pa.string()
+    
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            # В CSV пустое число (позиция, метрики строки с ошибкой) - пустая строка, в Parquet - null
+            self._rows.append({
+                column: (None if value == "" and column in PARQUET_NUMERIC_COLUMNS else value)
+                for column, value in row.items()
+            })
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+    
+    def _flush(self) -> None:
+        if self._rows:
+            self._writer.write_batch(pa.RecordBatch.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+    
+    def _close_file(self, complete: bool) -> None:
+        if complete:
+            self._flush()
+        self._writer.close()
+
+def create_report_writer(path: str, file_format: str) -> ReportWriter:
+    """
+    Создание записи отчета по формату (REPORT_FORMAT)
+    
+    Args:
+        path: Путь к файлу отчета
+        file_format: csv или parquet
+    
+    Raises:
+        ValueError: Если формат не поддерживается
+    """
+    if file_format == "csv":
+        return CsvReportWriter(path)
+    if file_format == "parquet":
+        return ParquetReportWriter(path)
+    raise ValueError(f"Неподдерживаемый формат отчета: {file_format}")
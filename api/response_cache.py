@@ -0,0 +1,146 @@
+"""
+Персистентный кэш ответов OpenAI web search в отдельном SQLite файле
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+from config import CACHE_ENABLED, CACHE_PATH, CACHE_TTL_HOURS, CACHE_MAX_ENTRIES, CACHE_BUSY_TIMEOUT_MS
+
+class ResponseCache:
+    """Кэш источников и usage по ключу (модель, запрос, страна) с TTL и LRU вытеснением"""
+    
+    def __init__(self, db_path: str = CACHE_PATH, ttl_hours: float = CACHE_TTL_HOURS,
+                 max_entries: int = CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.init_db()
+    
+    def connect(self) -> sqlite3.Connection:
+        """
+        Постоянное подключение к базе кэша для текущего потока
+        
+        Как и в реестре: одно WAL-соединение на поток, транзакции через `with conn:`.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=CACHE_BUSY_TIMEOUT_MS / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={CACHE_BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+    
+    def close(self) -> None:
+        """Закрытие соединения текущего потока"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def init_db(self):
+        """Создание таблицы кэша"""
+        with self.connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT,
+                    created_ts REAL,
+                    last_used_ts REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_lru ON response_cache(last_used_ts)")
+    
+    @staticmethod
+    def make_key(model: str, query: str, country: str = "") -> str:
+        """
+        Ключ кэша из модели, нормализованного запроса и страны
+        
+        Args:
+            model: Модель OpenAI
+            query: Поисковый запрос
+            country: Страна запроса
+            
+        Returns:
+            SHA-256 хеш ключа
+        """
+        normalized = [" ".join(str(part).split()).casefold() for part in (model, query, country)]
+        return hashlib.sha256("\x00".join(normalized).encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Получение свежей записи из кэша
+        
+        Args:
+            key: Ключ из make_key
+            
+        Returns:
+            Dict с sources и usage или None, если записи нет или она устарела
+        """
+        now = time.time()
+        with self.connect() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT payload, created_ts FROM response_cache WHERE key = ?", (key,))
+            row = cur.fetchone()
+            
+            if row and now - row[1] <= self.ttl_seconds:
+                cur.execute("UPDATE response_cache SET last_used_ts = ? WHERE key = ?", (now, key))
+            elif row:
+                # Запись устарела - удаляем
+                cur.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                row = None
+        
+        if row:
+            with self._lock:
+                self.hits += 1
+            return json.loads(row[0])
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def set(self, key: str, sources: list, usage: Optional[Dict[str, Any]]) -> None:
+        """
+        Сохранение ответа в кэш с вытеснением давно неиспользованных записей
+        
+        Args:
+            key: Ключ из make_key
+            sources: Извлеченные источники
+            usage: Usage ответа в виде словаря
+        """
+        now = time.time()
+        payload = json.dumps({"sources": sources, "usage": usage}, ensure_ascii=False)
+        
+        with self.connect() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?)",
+                (key, payload, now, now)
+            )
+            
+            cur.execute("SELECT COUNT(*) FROM response_cache")
+            overflow = cur.fetchone()[0] - self.max_entries
+            if overflow > 0:
+                cur.execute(
+                    "DELETE FROM response_cache WHERE key IN "
+                    "(SELECT key FROM response_cache ORDER BY last_used_ts LIMIT ?)",
+                    (overflow,)
+                )
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Счетчики попаданий и промахов с момента запуска процесса"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+# Глобальный экземпляр кэша (None если кэш выключен)
+response_cache = ResponseCache() if CACHE_ENABLED else None
@@ -0,0 +1,163 @@
+"""
+Потоковый разбор multipart/form-data загрузки без буферизации тела в памяти
+"""
+
+import os
+import hashlib
+import tempfile
+from typing import Dict, Optional
+from config import UPLOAD_DIR
+from file_processor import FileProcessor
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+    from python_multipart.exceptions import MultipartParseError
+except ImportError:
+    # python-multipart < 0.0.13 ставится как пакет multipart
+    from multipart.multipart import MultipartParser, parse_options_header
+    from multipart.exceptions import MultipartParseError
+
+class UploadFormError(Exception):
+    """Тело запроса не является корректной формой с файлом"""
+
+class UploadSpooler:
+    """
+    Разбор multipart-тела по мере поступления блоков
+    
+    Файл пишется во временный файл в UPLOAD_DIR и хешируется по ходу чтения;
+    как только он превышает max_size_mb, разбор прерывается. Текстовые поля
+    формы собираются в память, суммарно не больше max_form_bytes.
+    """
+    
+    def __init__(self, content_type: str, max_size_mb: int, max_form_bytes: int, file_field: str = "file"):
+        """
+        Args:
+            content_type: Заголовок Content-Type запроса
+            max_size_mb: Максимальный размер файла в МБ
+            max_form_bytes: Максимальный суммарный размер текстовых полей
+            file_field: Имя поля формы с файлом
+        
+        Raises:
+            UploadFormError: Если тело не multipart/form-data
+        """
+        mime_type, params = parse_options_header(content_type or "")
+        boundary = params.get(b"boundary")
+        if mime_type != b"multipart/form-data" or not boundary:
+            raise UploadFormError("Очікується multipart/form-data")
+        
+        self.max_size_mb = max_size_mb
+        self.max_form_bytes = max_form_bytes
+        self.file_field = file_field
+        self.file_path: Optional[str] = None
+        self.filename = ""
+        self.size = 0
+        self.fields: Dict[str, str] = {}
+        self._sha256 = hashlib.sha256()
+        self._file = None
+        self._form_bytes = 0
+        self._headers: Dict[str, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part_name: Optional[str] = None
+        self._part_is_file = False
+        self._part_value = b""
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished
+        })
+    
+    @property
+    def file_hash(self) -> str:
+        """SHA-256 содержимого файла"""
+        return self._sha256.hexdigest()
+    
+    def write(self, chunk: bytes) -> None:
+        """
+        Очередной блок тела запроса
+        
+        Raises:
+            ValueError: Если файл или поля формы превышают лимит
+            UploadFormError: Если тело запроса повреждено
+        """
+        try:
+            self._parser.write(chunk)
+        except MultipartParseError as e:
+            raise UploadFormError("Некоректне тіло запиту") from e
+    
+    def finish(self) -> None:
+        """
+        Завершение разбора после последнего блока
+        
+        Raises:
+            UploadFormError: Если в форме нет файла
+        """
+        try:
+            self._parser.finalize()
+        except MultipartParseError as e:
+            raise UploadFormError("Некоректне тіло запиту") from e
+        if self._file is None:
+            raise UploadFormError("Файл не завантажено")
+        self._file.close()
+    
+    def discard(self) -> None:
+        """Удаление временного файла (при ошибке разбора или отказе в обработке)"""
+        if self._file is not None:
+            self._file.close()
+        if self.file_path and os.path.exists(self.file_path):
+            os.remove(self.file_path)
+    
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+        self._part_name = None
+        self._part_is_file = False
+        self._part_value = b""
+    
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+    
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+    
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.decode("latin-1").lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+    
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get("content-disposition", b""))
+        self._part_name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        if b"filename" not in options:
+            return
+        if self._part_name != self.file_field or self._file is not None:
+            raise UploadFormError("Очікується один файл у полі file")
+        
+        self._part_is_file = True
+        self.filename = options[b"filename"].decode("utf-8", errors="replace")
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(
+            delete=False, suffix=FileProcessor.get_file_extension(self.filename), dir=UPLOAD_DIR
+        )
+        self.file_path = self._file.name
+    
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        chunk = data[start:end]
+        if self._part_is_file:
+            self.size += len(chunk)
+            FileProcessor.validate_file_size(self.size, self.max_size_mb)
+            self._sha256.update(chunk)
+            self._file.write(chunk)
+            return
+        
+        self._form_bytes += len(chunk)
+        if self._form_bytes > self.max_form_bytes:
+            raise ValueError("Поля форми занадто великі")
+        self._part_value += chunk
+    
+    def _on_part_end(self) -> None:
+        if not self._part_is_file and self._part_name:
+            self.fields[self._part_name] = self._part_value.decode("utf-8", errors="replace")
@@ -0,0 +1,62 @@
+"""
+Пропускная способность захвата задач из очереди в SQLite при конкурирующих воркерах
+
+Каждый воркер в своем потоке (со своим соединением) захватывает задачу и сразу
+завершает ее, пока очередь не опустеет. Проверяется, что ни одна задача не
+захвачена дважды.
+
+Запуск: python bench/bench_claim.py [jobs]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+
+JOBS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+os.environ.update({
+    "OPENAI_API_KEY": "bench",
+    "REGISTRY_PATH": os.path.join(tempfile.mkdtemp(), "registry.sqlite")
+})
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import database
+from database import Database
+
+def run(claimers: int) -> None:
+    database.REGISTRY_PATH = os.path.join(tempfile.mkdtemp(), "registry.sqlite")
+    registry = Database()
+    for i in range(JOBS):
+        registry.create_job(f"user{i}@example.com", f"10.0.{i // 256}.{i % 256}", f"/tmp/upload{i}.csv")
+    
+    claimed = []
+    lock = threading.Lock()
+    
+    def worker(worker_id: str):
+        while True:
+            job = registry.claim_job(worker_id, 60)
+            if job is None:
+                return
+            registry.finish_job(job["id"], worker_id)
+            with lock:
+                claimed.append(job["id"])
+    
+    threads = [threading.Thread(target=worker, args=(f"w{n}",)) for n in range(claimers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    assert len(claimed) == len(set(claimed)) == JOBS, "задача захвачена дважды или потеряна"
+    print(f"воркеров {claimers:2}: {JOBS / elapsed:7.0f} захватов/с ({elapsed:.2f}s на {JOBS} задач)")
+
+def main():
+    for claimers in (1, 2, 4, 8, 16):
+        run(claimers)
+
+if __name__ == "__main__":
+    main()
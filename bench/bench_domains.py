@@ -0,0 +1,46 @@
+"""
+Извлечение target_domain для большого файла: по строке (extract_domain_from_url)
+против векторного extract_domains
+
+Запуск: python bench/bench_domains.py [rows] [unique_sites]
+"""
+
+import os
+import sys
+import time
+import random
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+UNIQUE_SITES = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import pandas as pd
+from file_processor import FileProcessor
+
+def make_websites(rows: int, unique_sites: int) -> pd.Series:
+    """Колонка Website: повторяющиеся сайты в разных написаниях"""
+    rng = random.Random(13)
+    forms = ("{}", "www.{}", "https://{}/", "https://www.{}/catalog?page=2", "http://{}/blog#top")
+    sites = [rng.choice(forms).format(f"site{i}.com") for i in range(unique_sites)]
+    return pd.Series([sites[rng.randrange(unique_sites)] for _ in range(rows)])
+
+def main():
+    websites = make_websites(ROWS, UNIQUE_SITES)
+    
+    started = time.perf_counter()
+    per_row = websites.map(FileProcessor.extract_domain_from_url)
+    per_row_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    vectorized = FileProcessor.extract_domains(websites)
+    vectorized_seconds = time.perf_counter() - started
+    
+    assert per_row.tolist() == vectorized.tolist(), "результаты расходятся"
+    print(f"{ROWS} строк, {UNIQUE_SITES} уникальных сайтов")
+    print(f"по строке: {per_row_seconds:.2f}s, векторно: {vectorized_seconds:.3f}s, "
+          f"ускорение {per_row_seconds / vectorized_seconds:.0f}x")
+
+if __name__ == "__main__":
+    main()
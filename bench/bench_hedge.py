@@ -0,0 +1,52 @@
+"""
+p50/p95/p99 времени задачи на сервисе с долгим хвостом задержек, с хеджированием и без
+
+Запуск: python bench/bench_hedge.py hedge|off [budget] [jobs] [rows_per_job]
+"""
+
+import os
+import sys
+import time
+
+MODE = sys.argv[1] if len(sys.argv) > 1 else "hedge"
+BUDGET = sys.argv[2] if len(sys.argv) > 2 else "0.2"
+JOBS = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+ROWS_PER_JOB = int(sys.argv[4]) if len(sys.argv) > 4 else 16
+
+os.environ.update({
+    "OPENAI_API_KEY": "bench", "CACHE_ENABLED": "false",
+    "OPENAI_ADAPTIVE_CONCURRENCY": "false", "OPENAI_CONCURRENCY": "4",
+    "OPENAI_HEDGE_ENABLED": "true" if MODE == "hedge" else "false", "OPENAI_HEDGE_BUDGET": BUDGET,
+    "OPENAI_HEDGE_MIN_DELAY_SECONDS": "0.05", "OPENAI_HEDGE_DELAY_SECONDS": "1"
+})
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from openai_client import openai_client
+from pipeline import QueryPipeline
+from stubs import LongTailStub, install, make_rows
+
+def percentile(values: list, share: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+def main():
+    stub = LongTailStub()
+    install(openai_client, stub)
+    
+    times = []
+    for job in range(JOBS):
+        pipeline = QueryPipeline(openai_client, concurrency=openai_client.max_concurrency,
+                                 hedge_budget=openai_client.new_hedge_budget())
+        started = time.perf_counter()
+        pipeline.run([make_rows(ROWS_PER_JOB, prefix=f"q{job}-")])
+        times.append(time.perf_counter() - started)
+    
+    times.sort()
+    rows_total = JOBS * ROWS_PER_JOB
+    extra = stub.calls - rows_total
+    print(f"{MODE} (бюджет {BUDGET}): p50 {percentile(times, 0.5):.2f}s, p95 {percentile(times, 0.95):.2f}s, "
+          f"p99 {percentile(times, 0.99):.2f}s, max {times[-1]:.2f}s, всего {sum(times):.0f}s, "
+          f"доп. запросов {extra} ({extra / rows_total:.1%})")
+    print(f"хедж: {openai_client.get_stats()['hedging']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Ускорение конвейера от параллельности на клиенте с фиксированной задержкой
+
+Запуск: python bench/bench_pipeline.py [rows] [latency_seconds]
+"""
+
+import os
+import sys
+import time
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from pipeline import QueryPipeline
+from stubs import FixedLatencyClient, make_rows
+
+def main():
+    baseline = None
+    for concurrency in (1, 2, 4, 8, 16):
+        client = FixedLatencyClient(LATENCY)
+        results = []
+        pipeline = QueryPipeline(client, concurrency, on_row_done=lambda row, response, metrics: results.append(metrics))
+        
+        started = time.perf_counter()
+        pipeline.run([make_rows(ROWS)])
+        elapsed = time.perf_counter() - started
+        
+        baseline = baseline or elapsed
+        print(f"concurrency {concurrency:2}: {elapsed:.2f}s, ускорение {baseline / elapsed:.1f}x, "
+              f"строк {len(results)}, запросов {client.calls}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Отказ в загрузках при флуде: сколько запросов отсекает лимит по IP и чего стоит отказ
+
+1) RateLimiter без HTTP: флуд с одного ключа и с миллиона разных ключей (LRU-вытеснение).
+2) POST /upload через ASGI с одного IP: первые RATE_LIMIT_IP_BURST загрузок принимаются,
+   остальные получают 429 до чтения тела; печатается задержка принятых и отклоненных.
+
+Запуск: python bench/bench_rate_limit.py [requests]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+workdir = tempfile.mkdtemp()
+os.environ.update({
+    "OPENAI_API_KEY": "bench",
+    "SMTP_HOST": "localhost",
+    "SMTP_USER": "bench",
+    "SMTP_PASS": "bench",
+    "CACHE_ENABLED": "false",
+    "REGISTRY_PATH": os.path.join(workdir, "registry.sqlite"),
+    "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+    "RATE_LIMIT_ENABLED": "true"
+})
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import httpx
+from rate_limit import RateLimiter
+
+def percentile(values, share: float) -> float:
+    """Перцентиль в миллисекундах"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] * 1000
+
+def bench_limiter() -> None:
+    limiter = RateLimiter(per_minute=6, burst=10, max_keys=10000)
+    started = time.perf_counter()
+    for _ in range(1_000_000):
+        limiter.try_acquire("10.0.0.1")
+    elapsed = time.perf_counter() - started
+    print(f"один ключ: {1_000_000 / elapsed:,.0f} проверок/с, {limiter.get_stats()}")
+    
+    limiter = RateLimiter(per_minute=6, burst=10, max_keys=10000)
+    started = time.perf_counter()
+    for i in range(1_000_000):
+        limiter.try_acquire(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")
+    elapsed = time.perf_counter() - started
+    print(f"1M ключей: {1_000_000 / elapsed:,.0f} проверок/с, {limiter.get_stats()}")
+
+async def bench_http() -> None:
+    import main
+    # Воркеры не запускаются: принятые задачи остаются в очереди, замеряется только прием
+    main.job_executor.start = lambda handler: None
+    body = b"Country,Prompt,Website\n" + b"UK,best crm,example.com\n" * 1000
+    latencies = {200: [], 429: []}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        for i in range(REQUESTS):
+            request_started = time.perf_counter()
+            response = await client.post(
+                "/upload",
+                files={"file": ("prompts.csv", body + f"UK,prompt {i},example.com\n".encode())},
+                data={"email": f"user{i}@example.com"},
+                headers={"X-Forwarded-For": "10.0.0.1"}
+            )
+            latencies.setdefault(response.status_code, []).append(time.perf_counter() - request_started)
+        elapsed = time.perf_counter() - started
+    
+    print(f"HTTP флуд: {REQUESTS} запросов за {elapsed:.2f} с, {REQUESTS / elapsed:,.0f} запросов/с")
+    for status, values in sorted(latencies.items()):
+        if values:
+            print(f"  {status}: {len(values)} шт., p50 {percentile(values, 0.5):.2f} мс "
+                  f"p99 {percentile(values, 0.99):.2f} мс")
+    print(f"  лимитер IP: {main.ip_rate_limiter.get_stats()}")
+
+def main():
+    bench_limiter()
+    asyncio.run(bench_http())
+
+if __name__ == "__main__":
+    main()
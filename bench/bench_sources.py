@@ -0,0 +1,61 @@
+"""
+Метрики группы Prompt/Country с 50 источниками: разбор источников для каждого
+целевого домена (calculate_metrics_for_query) против однократного разбора
+(parse_sources) и прохода по готовым записям для каждого домена, как в QueryPipeline
+
+Запуск: python bench/bench_sources.py [sources] [domains] [repeats]
+"""
+
+import os
+import sys
+import random
+import timeit
+
+SOURCES = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+DOMAINS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+REPEATS = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from metrics import MetricsCalculator
+
+SITES = ("amazon.com", "www.amazon.com", "ebay.com", "reddit.com", "quora.com", "a.co", "AMAZON.com")
+PATHS = ("blog", "shop", "docs", "help", "review", "product", "forum")
+TARGETS = ("amazon.com", "ebay.com", "reddit.com", "example.com", "a.co", "quora.com", "etsy.com", "walmart.com")
+
+def make_sources(count: int):
+    """Источники ответа OpenAI: повторяющиеся домены и немного некорректных URL"""
+    rng = random.Random(2)
+    return [
+        {"url": f"https://{rng.choice(SITES)}/{rng.choice(PATHS)}/{i}" if rng.random() > 0.05 else "not a url"}
+        for i in range(count)
+    ]
+
+def main():
+    sources = make_sources(SOURCES)
+    targets = [TARGETS[i % len(TARGETS)] for i in range(DOMAINS)]
+    
+    def per_domain():
+        return [MetricsCalculator.calculate_metrics_for_query(sources, target, "UK") for target in targets]
+    
+    def parsed_once():
+        records = MetricsCalculator.parse_sources(sources)
+        return [MetricsCalculator.calculate_metrics_from_records(records, target, "UK") for target in targets]
+    
+    assert per_domain() == parsed_once(), "результаты расходятся"
+    
+    def microseconds(func) -> float:
+        return timeit.timeit(func, number=REPEATS) / REPEATS * 1e6
+    
+    records = MetricsCalculator.parse_sources(sources)
+    parse = microseconds(lambda: MetricsCalculator.parse_sources(sources))
+    single = microseconds(lambda: MetricsCalculator.calculate_metrics_from_records(records, targets[0], "UK"))
+    before = microseconds(per_domain)
+    after = microseconds(parsed_once)
+    
+    print(f"{SOURCES} источников: parse_sources {parse:.0f} мкс, проход по записям {single:.0f} мкс на домен")
+    print(f"{DOMAINS} доменов в группе: разбор на каждый домен {before:.0f} мкс, "
+          f"разбор один раз {after:.0f} мкс ({before / after:.1f}x)")
+
+if __name__ == "__main__":
+    main()
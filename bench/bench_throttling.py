@@ -0,0 +1,43 @@
+"""
+Фиксированная параллельность против адаптивного лимита (AIMD) на сервисе,
+который отвечает 429 при перегрузке
+
+Запуск: python bench/bench_throttling.py fixed4|fixed16|aimd [capacity] [rows]
+"""
+
+import os
+import sys
+import time
+
+MODE = sys.argv[1] if len(sys.argv) > 1 else "aimd"
+CAPACITY = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+ROWS = int(sys.argv[3]) if len(sys.argv) > 3 else 600
+
+os.environ.update({
+    "OPENAI_API_KEY": "bench", "CACHE_ENABLED": "false",
+    "OPENAI_BACKOFF_BASE_SECONDS": "0.2", "OPENAI_BACKOFF_MAX_SECONDS": "2", "OPENAI_MAX_ATTEMPTS": "8",
+    "OPENAI_ADAPTIVE_CONCURRENCY": "true" if MODE == "aimd" else "false",
+    "OPENAI_MAX_CONCURRENCY": "32", "OPENAI_LATENCY_TARGET_SECONDS": "2"
+})
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from openai_client import openai_client
+from pipeline import QueryPipeline
+from stubs import ThrottlingStub, install, make_rows
+
+def main():
+    stub = ThrottlingStub(CAPACITY)
+    install(openai_client, stub)
+    concurrency = {"fixed4": 4, "fixed16": 16}.get(MODE, openai_client.max_concurrency)
+    pipeline = QueryPipeline(openai_client, concurrency=concurrency)
+    
+    started = time.perf_counter()
+    pipeline.run([make_rows(ROWS)])
+    elapsed = time.perf_counter() - started
+    
+    print(f"{MODE}: {elapsed:.1f}s, 429: {stub.throttled}, пик в полете: {stub.peak}, "
+          f"повторы: {pipeline.stats['retries']}, строк с ошибкой: {pipeline.stats['errors']}")
+    print(f"лимит: {openai_client.get_stats()['concurrency']}")
+
+if __name__ == "__main__":
+    main()
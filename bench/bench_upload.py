@@ -0,0 +1,105 @@
+"""
+Задержка 100 одновременных загрузок /upload и отзывчивость сервера под этой нагрузкой
+
+Поднимает uvicorn с приложением (воркеры задач выключены, реестр и загрузки во
+временном каталоге), отправляет параллельные загрузки CSV и в это же время
+опрашивает лендинг. Печатает p50/p95 загрузок и p50/p99/max посторонних запросов.
+
+Запуск: python bench/bench_upload.py [uploads] [rows]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import subprocess
+
+import httpx
+
+UPLOADS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+ROWS = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+ROUNDS = 3
+PORT = 8765
+
+def percentile(values, share: float) -> float:
+    """Перцентиль в миллисекундах"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] * 1000
+
+def make_csv(tag: str) -> bytes:
+    """CSV на ROWS строк с уникальным содержимым (хеш файла у каждой загрузки свой)"""
+    lines = ["Country,Prompt,Website"] + [f"UK,{tag} prompt {i},example.com" for i in range(ROWS)]
+    return ("\n".join(lines) + "\n").encode()
+
+async def run_round(client: httpx.AsyncClient, round_no: int) -> None:
+    uploads, pings = [], []
+    done = asyncio.Event()
+    
+    async def upload(i: int):
+        started = time.perf_counter()
+        response = await client.post(
+            "/upload",
+            files={"file": ("prompts.csv", make_csv(f"r{round_no}-{i}"))},
+            data={"email": f"user{i}@example.com"},
+            headers={"X-Forwarded-For": f"10.{round_no}.{i // 256}.{i % 256}"}
+        )
+        assert response.status_code == 200, response.text
+        uploads.append(time.perf_counter() - started)
+    
+    async def ping():
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/")
+            pings.append(time.perf_counter() - started)
+    
+    pinger = asyncio.create_task(ping())
+    started = time.perf_counter()
+    await asyncio.gather(*(upload(i) for i in range(UPLOADS)))
+    wall = time.perf_counter() - started
+    done.set()
+    await pinger
+    print(f"раунд {round_no}: {wall:.2f} с, загрузка p50 {percentile(uploads, 0.5):.0f} мс "
+          f"p95 {percentile(uploads, 0.95):.0f} мс | GET / p50 {percentile(pings, 0.5):.1f} мс "
+          f"p99 {percentile(pings, 0.99):.1f} мс max {max(pings) * 1000:.1f} мс (n={len(pings)})")
+
+async def run_client() -> None:
+    limits = httpx.Limits(max_connections=UPLOADS + 10)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=60, limits=limits) as client:
+        for _ in range(100):
+            try:
+                await client.get("/")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        for round_no in range(ROUNDS):
+            await run_round(client, round_no)
+
+def main():
+    workdir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="bench",
+        SMTP_HOST="localhost",
+        SMTP_USER="bench",
+        SMTP_PASS="bench",
+        CACHE_ENABLED="false",
+        REGISTRY_PATH=os.path.join(workdir, "registry.sqlite"),
+        UPLOAD_DIR=os.path.join(workdir, "uploads"),
+        JOB_WORKERS="0",
+        JOB_QUEUE_SIZE="100000",
+        RATE_LIMIT_ENABLED="false"
+    )
+    api_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=api_dir, env=env, stdout=subprocess.DEVNULL
+    )
+    try:
+        asyncio.run(run_client())
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Заглушки OpenAI Responses API для бенчмарков и тестов
+
+Заглушка подставляется вместо client.responses у OpenAIClient и отвечает
+одним источником без сети, с задержкой и ошибками по выбранной модели.
+"""
+
+import time
+import types
+import random
+import threading
+import httpx
+import openai
+
+def fake_response(url: str = "https://a.com/x") -> types.SimpleNamespace:
+    """Ответ web search с одним источником и без usage"""
+    source = types.SimpleNamespace(url=url, title="t", description="")
+    return types.SimpleNamespace(output=[types.SimpleNamespace(sources=[source])], usage=None)
+
+def install(client, stub) -> None:
+    """Подстановка заглушки в OpenAIClient"""
+    client.client = types.SimpleNamespace(responses=stub)
+
+def make_rows(count: int, prefix: str = "q") -> list:
+    """Строки задачи с уникальными запросами (кэш их не склеит)"""
+    return [
+        {"Prompt": f"{prefix}{i}", "Country": "UK", "Website": "a.com", "target_domain": "a.com"}
+        for i in range(count)
+    ]
+
+class ThrottlingStub:
+    """
+    Сервис с ограниченной емкостью: больше capacity одновременных запросов - 429
+    
+    Задержка ответа растет с нагрузкой (base_latency + load_latency * в полете),
+    как у перегруженного API.
+    """
+    
+    def __init__(self, capacity: int, base_latency: float = 0.2, jitter: float = 0.1,
+                 load_latency: float = 0.01, reject_latency: float = 0.02):
+        self.capacity = capacity
+        self.base_latency = base_latency
+        self.jitter = jitter
+        self.load_latency = load_latency
+        self.reject_latency = reject_latency
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._request = httpx.Request("POST", "https://api.openai.com/v1/responses")
+    
+    def create(self, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.in_flight)
+            load = self.in_flight
+        try:
+            if load > self.capacity:
+                time.sleep(self.reject_latency)
+                with self._lock:
+                    self.throttled += 1
+                raise openai.RateLimitError(
+                    "rate limited", response=httpx.Response(429, request=self._request), body=None
+                )
+            time.sleep(self.base_latency + random.uniform(0, self.jitter) + self.load_latency * load)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        return fake_response()
+
+class FixedLatencyClient:
+    """
+    Заглушка OpenAIClient: search_with_web отвечает через latency секунд
+    
+    Без лимитов, повторов и кэша клиента - измеряет только параллельность конвейера.
+    """
+    
+    def __init__(self, latency: float = 0.1):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+    
+    def search_with_web(self, query: str, country: str = "", deadline=None, hedge_budget=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return {
+            "sources": [{"url": "https://www.amazon.com/x"}, {"url": "https://b.com/blog"}],
+            "usage": None,
+            "query": query
+        }
+
+class LongTailStub:
+    """
+    Сервис с долгим хвостом задержек: tail_share ответов за tail_latency, остальные за fast_latency
+    
+    Задержки берутся из собственного генератора с seed, чтобы прогоны были сравнимы.
+    """
+    
+    def __init__(self, tail_share: float = 0.02, fast_latency: tuple = (0.15, 0.35),
+                 tail_latency: tuple = (5.0, 10.0), seed: int = 7):
+        self.tail_share = tail_share
+        self.fast_latency = fast_latency
+        self.tail_latency = tail_latency
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def create(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            slow = self._random.random() < self.tail_share
+            latency = self._random.uniform(*(self.tail_latency if slow else self.fast_latency))
+        time.sleep(latency)
+        return fake_response()
@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули api импортируются плоско, как в main.py; заглушки OpenAI - из bench
+sys.path.insert(0, os.path.join(ROOT, "api"))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("CACHE_ENABLED", "false")
+# main.py проверяет конфигурацию при импорте
+for name in ("SMTP_HOST", "SMTP_USER", "SMTP_PASS"):
+    os.environ.setdefault(name, "test")
+# Глобальный реестр database.db создается при импорте - не в рабочем каталоге
+os.environ.setdefault("REGISTRY_PATH", os.path.join(tempfile.mkdtemp(), "registry.sqlite"))
+os.environ.setdefault("UPLOAD_DIR", os.path.join(tempfile.mkdtemp(), "uploads"))
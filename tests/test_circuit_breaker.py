@@ -0,0 +1,67 @@
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+def open_breaker() -> CircuitBreaker:
+    """Breaker, открытый двумя сбоями; пауза перед пробным запросом нулевая"""
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=2, window_seconds=60, open_seconds=0)
+    for _ in range(2):
+        breaker.record("failure", breaker.allow())
+    assert breaker.state == OPEN
+    return breaker
+
+def test_opens_on_failure_rate():
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=4, window_seconds=60, open_seconds=30)
+    for outcome in ("ok", "failure", "ok"):
+        breaker.record(outcome, breaker.allow())
+    assert breaker.state == CLOSED
+    breaker.record("failure", breaker.allow())
+    assert breaker.state == OPEN
+    assert breaker.allow() is None
+    assert breaker.retry_after() > 0
+
+def test_probe_success_closes():
+    breaker = open_breaker()
+    probe = breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is None
+    breaker.record("ok", probe)
+    assert breaker.state == CLOSED
+
+def test_probe_failure_reopens():
+    breaker = open_breaker()
+    breaker.record("failure", breaker.allow())
+    assert breaker.state == OPEN
+
+def test_stale_results_do_not_decide_half_open():
+    """Ответы запросов, начатых до открытия, не считаются результатом пробного запроса"""
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=2, window_seconds=60, open_seconds=0)
+    stale = [breaker.allow() for _ in range(3)]
+    breaker.record("failure", stale[0])
+    breaker.record("failure", stale[1])
+    assert breaker.state == OPEN
+    
+    probe = breaker.allow()
+    assert breaker.state == HALF_OPEN
+    breaker.record("ok", stale[2])
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is None
+    
+    breaker.record("failure", probe)
+    assert breaker.state == OPEN
+
+def test_stale_probe_does_not_affect_closed_window():
+    """Ответ пробного запроса прошлого half_open не попадает в окно нового closed"""
+    breaker = open_breaker()
+    breaker.record("ok", breaker.allow())
+    assert breaker.state == CLOSED
+    
+    permit = breaker.allow()
+    breaker.record("failure", permit)
+    breaker.record("failure", permit - 1)
+    assert breaker.get_stats()["window_requests"] == 1
+    assert breaker.state == CLOSED
+
+def test_closed_permit_only_when_closed():
+    breaker = open_breaker()
+    assert breaker.closed_permit() is None
+    breaker.record("ok", breaker.allow())
+    assert breaker.closed_permit() == breaker.allow()
@@ -0,0 +1,85 @@
+import threading
+import openai
+from concurrency_limit import AdaptiveConcurrencyLimiter
+from stubs import ThrottlingStub
+
+def run_against_stub(limiter: AdaptiveConcurrencyLimiter, stub: ThrottlingStub,
+                     workers: int, requests_per_worker: int) -> list:
+    """Воркеры шлют запросы в заглушку через лимит; возвращает лимит после каждого ответа"""
+    history = []
+    lock = threading.Lock()
+    
+    def worker():
+        for _ in range(requests_per_worker):
+            started = limiter.acquire()
+            try:
+                stub.create()
+                outcome = "ok"
+            except openai.RateLimitError:
+                outcome = "throttled"
+            limiter.release(started, outcome)
+            with lock:
+                history.append(int(limiter.limit))
+    
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return history
+
+def test_limit_settles_near_capacity():
+    """Лимит растет от 1 до емкости сервиса и дальше колеблется около нее"""
+    capacity = 6
+    stub = ThrottlingStub(capacity, base_latency=0.005, jitter=0.005, load_latency=0, reject_latency=0.001)
+    limiter = AdaptiveConcurrencyLimiter(initial=1, min_limit=1, max_limit=32, latency_target=10)
+    
+    history = run_against_stub(limiter, stub, workers=16, requests_per_worker=60)
+    
+    assert limiter.increases > 0
+    assert limiter.decreases > 0
+    steady = history[len(history) // 2:]
+    assert max(steady) <= capacity + 1
+    assert sum(steady) / len(steady) >= capacity / 2
+    assert limiter.in_flight == 0
+
+def test_limit_stays_at_max_without_throttling():
+    """Сервис без перегрузки: лимит доходит до max_limit и не снижается"""
+    stub = ThrottlingStub(100, base_latency=0.002, jitter=0.002, load_latency=0)
+    limiter = AdaptiveConcurrencyLimiter(initial=2, min_limit=1, max_limit=8, latency_target=10)
+    
+    run_against_stub(limiter, stub, workers=12, requests_per_worker=40)
+    
+    assert int(limiter.limit) == 8
+    assert limiter.decreases == 0
+    assert stub.throttled == 0
+
+def test_throttled_halves_limit_once_per_wave():
+    """429 умножает лимит на backoff; ответы, начатые до снижения, его повторно не снижают"""
+    limiter = AdaptiveConcurrencyLimiter(initial=8, min_limit=1, max_limit=32, latency_target=10)
+    wave = [limiter.acquire() for _ in range(4)]
+    
+    limiter.release(wave[0], "throttled")
+    assert int(limiter.limit) == 4
+    for started in wave[1:]:
+        limiter.release(started, "throttled")
+    assert int(limiter.limit) == 4
+    assert limiter.decreases == 1
+    
+    # Следующая волна после снижения снова снижает лимит
+    limiter.release(limiter.acquire(), "throttled")
+    assert int(limiter.limit) == 2
+    assert limiter.decreases == 2
+
+def test_limit_does_not_drop_below_min():
+    limiter = AdaptiveConcurrencyLimiter(initial=2, min_limit=2, max_limit=8, latency_target=10)
+    for _ in range(3):
+        limiter.release(limiter.acquire(), "throttled")
+    assert int(limiter.limit) == 2
+
+def test_slow_response_counts_as_congestion():
+    """Ответ медленнее latency_target снижает лимит так же, как 429"""
+    limiter = AdaptiveConcurrencyLimiter(initial=8, min_limit=1, max_limit=32, latency_target=0.5)
+    started = limiter.acquire()
+    limiter.release(started - 1.0, "ok")
+    assert int(limiter.limit) == 4
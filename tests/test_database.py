@@ -0,0 +1,70 @@
+import pytest
+import database
+from database import Database
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "REGISTRY_PATH", str(tmp_path / "registry.sqlite"))
+    return Database()
+
+ROWS = [
+    {"Country": "UK", "Prompt": f"q{i}", "Website": "a.com", "target_domain": "a.com"}
+    for i in range(3)
+]
+
+def count_rows(registry: Database, job_id: str) -> int:
+    with registry.connect() as conn:
+        return conn.execute("SELECT COUNT(*) FROM job_rows WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+def test_finished_job_rows_are_purged(registry):
+    job_id = registry.create_job("a@b.c", "1.1.1.1", "/tmp/upload.csv")
+    job = registry.claim_job("w1", 60)
+    registry.save_job_rows(job_id, ROWS)
+    registry.save_row_result(job_id, 0, [], {"AIV-Score": 1})
+    registry.save_row_result(job_id, 1, [], {"AIV-Score": 2})
+    assert registry.get_job(job_id)["rows_done"] == 2
+    
+    assert registry.finish_job(job["id"], "w1") == "done"
+    assert count_rows(registry, job_id) == 0
+    assert registry.get_job(job_id)["rows_done"] == 2
+
+def test_requeued_job_keeps_rows(registry, monkeypatch):
+    monkeypatch.setattr(database, "JOB_MAX_ATTEMPTS", 2)
+    job_id = registry.create_job("a@b.c", "1.1.1.1", "/tmp/upload.csv")
+    registry.claim_job("w1", 60)
+    registry.save_job_rows(job_id, ROWS)
+    
+    assert registry.finish_job(job_id, "w1", "boom") == "queued"
+    assert count_rows(registry, job_id) == 3
+    
+    registry.claim_job("w1", 60)
+    assert registry.finish_job(job_id, "w1", "boom") == "failed"
+    assert count_rows(registry, job_id) == 0
+
+def test_expired_lease_without_attempts_purges_rows(registry, monkeypatch):
+    monkeypatch.setattr(database, "JOB_MAX_ATTEMPTS", 1)
+    job_id = registry.create_job("a@b.c", "1.1.1.1", "/tmp/upload.csv")
+    registry.claim_job("w1", -1)
+    registry.save_job_rows(job_id, ROWS)
+    
+    assert registry.claim_job("w2", 60) is None
+    assert registry.get_job(job_id)["status"] == "failed"
+    assert count_rows(registry, job_id) == 0
+
+def test_expired_lease_without_attempts_removes_upload(registry, monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "JOB_MAX_ATTEMPTS", 1)
+    upload = tmp_path / "upload.csv"
+    upload.write_text("Country,Prompt,Website\n")
+    job_id = registry.create_job("a@b.c", "1.1.1.1", str(upload))
+    registry.claim_job("w1", -1)
+    
+    assert registry.claim_job("w2", 60) is None
+    assert registry.get_job(job_id)["status"] == "failed"
+    assert not upload.exists()
+
+def test_final_error_fails_without_retries(registry, monkeypatch):
+    monkeypatch.setattr(database, "JOB_MAX_ATTEMPTS", 3)
+    job_id = registry.create_job("a@b.c", "1.1.1.1", "/tmp/upload.csv")
+    registry.claim_job("w1", 60)
+    assert registry.finish_job(job_id, "w1", "Отсутствуют колонки", final=True) == "failed"
+    assert registry.get_job(job_id)["attempts"] == 1
@@ -0,0 +1,76 @@
+import gzip
+import zipfile
+import pytest
+import pandas as pd
+from file_processor import FileProcessor
+
+CSV = "Country,Prompt,Website\nUK,best shoes,https://www.amazon.co.uk/x\nDE,usb-c hub,ebay.de\n"
+
+def test_reads_csv_gz(tmp_path):
+    path = tmp_path / "data.csv.gz"
+    path.write_bytes(gzip.compress(CSV.encode()))
+    df, rows = FileProcessor.process_file(str(path))
+    assert rows == 2
+    assert list(df["target_domain"]) == ["amazon.co.uk", "ebay.de"]
+
+def test_reads_tsv_gz(tmp_path):
+    path = tmp_path / "data.tsv.gz"
+    path.write_bytes(gzip.compress(CSV.replace(",", "\t").encode()))
+    _, rows = FileProcessor.process_file(str(path))
+    assert rows == 2
+
+def test_reads_zip(tmp_path):
+    path = tmp_path / "data.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("__MACOSX/._data.csv", "junk")
+        archive.writestr("data.csv", CSV)
+    _, rows = FileProcessor.process_file(str(path))
+    assert rows == 2
+
+def test_zip_without_csv(tmp_path):
+    path = tmp_path / "data.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("data.txt", CSV)
+    with pytest.raises(ValueError):
+        FileProcessor.process_file(str(path))
+
+@pytest.mark.parametrize("name", ["data.gz", "data.xlsx.gz", "data.zst"])
+def test_compressed_without_inner_csv_extension(tmp_path, name):
+    """Сжатый файл без .csv/.tsv внутри имени - ValueError, а не ошибка распаковки"""
+    path = tmp_path / name
+    path.write_bytes(gzip.compress(CSV.encode()))
+    with pytest.raises(ValueError, match="Неподдерживаемый формат"):
+        FileProcessor.process_file(str(path))
+
+def test_csv_zst(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "data.csv.zst"
+    path.write_bytes(zstandard.ZstdCompressor().compress(CSV.encode()))
+    _, rows = FileProcessor.process_file(str(path))
+    assert rows == 2
+
+URL_SAMPLES = [
+    "https://www.Amazon.co.uk/shop?x=1", "http://ebay.de", "www.reddit.com/r/x", "example.com#top",
+    "HTTP://Upper.com/path", "https://user:pw@host.com:8080/p", "//no-scheme.com", "https://",
+    "[::1]", "https://[::1]:8080/x", "https://[fe80::1", "http://fe80::1]/", "[not-an-ip]/x",
+    "https://www.пример.укр/шлях", "exa\tmple.com", "ftp://files.com", "www.", "?q=1", "@host.com",
+]
+
+def test_extract_domains_matches_per_row_parser():
+    """Векторный разбор колонки совпадает с extract_domain_from_url для каждой строки"""
+    import random
+    rng = random.Random(13)
+    alphabet = list("abcw.:/?#@[]-_%1") + ["www.", "http://", "https://", "::", "é", "ß", "\t"]
+    fuzzed = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 14))).strip() for _ in range(5000)]
+    websites = pd.Series(URL_SAMPLES + fuzzed)
+    
+    expected = [FileProcessor.extract_domain_from_url(url) for url in websites]
+    assert FileProcessor.extract_domains(websites).tolist() == expected
+
+def test_invalid_ipv6_host_row_is_dropped():
+    df = pd.DataFrame({
+        "Country": ["UK", "UK"],
+        "Prompt": ["q1", "q2"],
+        "Website": ["https://[fe80::1/shop", "amazon.co.uk"]
+    })
+    assert FileProcessor.clean_rows(df)["target_domain"].tolist() == ["amazon.co.uk"]
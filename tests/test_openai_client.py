@@ -0,0 +1,63 @@
+from email.utils import formatdate
+import time
+
+import httpx
+import openai
+import pytest
+
+from openai_client import OpenAIClient
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/responses")
+
+def status_error(status: int, headers: dict = None, body: dict = None, message: str = "error") -> openai.APIStatusError:
+    """Ошибка OpenAI SDK с заданным статусом и заголовками ответа"""
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    error_class = {429: openai.RateLimitError, 400: openai.BadRequestError}.get(status, openai.InternalServerError)
+    return error_class(message, response=response, body=body)
+
+@pytest.mark.parametrize("value, seconds", [("20ms", 0.02), ("6.5s", 6.5), ("1m30s", 90.0), ("1h0m0s", 3600.0)])
+def test_ratelimit_reset_parsing(value, seconds):
+    error = status_error(429, {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": value})
+    assert OpenAIClient.retry_after_seconds(error) == pytest.approx(seconds)
+
+def test_reset_of_exhausted_limit_is_used():
+    headers = {
+        "x-ratelimit-remaining-requests": "57", "x-ratelimit-reset-requests": "6m0s",
+        "x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "2s",
+    }
+    assert OpenAIClient.retry_after_seconds(status_error(429, headers)) == pytest.approx(2.0)
+
+def test_exhausted_limit_from_message():
+    """Без remaining-* исчерпанный лимит определяется по тексту ошибки"""
+    headers = {"x-ratelimit-reset-requests": "6m0s", "x-ratelimit-reset-tokens": "250ms"}
+    error = status_error(429, headers, message="Rate limit reached on tokens per min (TPM)")
+    assert OpenAIClient.retry_after_seconds(error) == pytest.approx(0.25)
+    assert OpenAIClient.retry_after_seconds(status_error(429, headers)) is None
+
+def test_reset_headers_ignored_for_server_errors():
+    headers = {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "6m0s"}
+    assert OpenAIClient.retry_after_seconds(status_error(503, headers)) is None
+
+def test_retry_after_headers():
+    assert OpenAIClient.retry_after_seconds(status_error(503, {"retry-after-ms": "1500"})) == pytest.approx(1.5)
+    assert OpenAIClient.retry_after_seconds(status_error(503, {"retry-after": "7"})) == pytest.approx(7.0)
+    date = formatdate(time.time() + 30, usegmt=True)
+    assert OpenAIClient.retry_after_seconds(status_error(429, {"retry-after": date})) == pytest.approx(30, abs=2)
+    past = formatdate(time.time() - 30, usegmt=True)
+    assert OpenAIClient.retry_after_seconds(status_error(429, {"retry-after": past})) == 0.0
+
+def test_retry_after_takes_precedence_over_reset():
+    headers = {"retry-after": "3", "x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "6m0s"}
+    assert OpenAIClient.retry_after_seconds(status_error(429, headers)) == pytest.approx(3.0)
+
+def test_no_hint_without_response():
+    assert OpenAIClient.retry_after_seconds(openai.APIConnectionError(request=REQUEST)) is None
+
+def test_is_retryable():
+    assert OpenAIClient.is_retryable(openai.APIConnectionError(request=REQUEST))
+    assert OpenAIClient.is_retryable(openai.APITimeoutError(request=REQUEST))
+    assert OpenAIClient.is_retryable(status_error(429))
+    assert OpenAIClient.is_retryable(status_error(500))
+    assert not OpenAIClient.is_retryable(status_error(429, body={"code": "insufficient_quota"}))
+    assert not OpenAIClient.is_retryable(status_error(400))
+    assert not OpenAIClient.is_retryable(ValueError("boom"))
@@ -0,0 +1,88 @@
+import os
+import time
+from fastapi.testclient import TestClient
+from rate_limit import TokenBucket, RateLimiter, UsageLimiter
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(rate=10, capacity=2)
+    now = time.monotonic()
+    assert bucket.try_acquire(2, now) == 0
+    assert bucket.try_acquire(1, now) > 0
+    assert bucket.try_acquire(1, now + 0.1) == 0
+
+def test_usage_limiter_release_refunds_reservation():
+    """Неотправленный запрос возвращает резерв и не меняет оценку токенов"""
+    limiter = UsageLimiter(requests_per_minute=60, tokens_per_minute=6000, tokens_estimate=500)
+    before = limiter.get_stats()
+    
+    reserved = limiter.acquire()
+    assert reserved == 500
+    assert limiter.get_stats()["tokens_available"] <= before["tokens_available"] - 500
+    
+    limiter.release(reserved)
+    after = limiter.get_stats()
+    assert after["requests_available"] == before["requests_available"]
+    assert after["tokens_available"] == before["tokens_available"]
+    assert after["tokens_estimate"] == 500
+    assert after["released"] == 1
+
+def test_usage_limiter_record_usage_updates_estimate():
+    limiter = UsageLimiter(requests_per_minute=60, tokens_per_minute=6000, tokens_estimate=500)
+    reserved = limiter.acquire()
+    limiter.record_usage(reserved, 1500)
+    assert limiter.get_stats()["tokens_estimate"] == 700
+
+def test_usage_limiter_gives_up_before_deadline():
+    limiter = UsageLimiter(requests_per_minute=6, tokens_per_minute=0, tokens_estimate=500)
+    assert limiter.acquire() is not None
+    assert limiter.acquire(deadline=time.monotonic() + 0.05) is None
+
+def test_rate_limiter_evicts_least_recently_used():
+    """Вытесняется ведро, к которому дольше всего не обращались; вытесненный ключ начинает с полного ведра"""
+    limiter = RateLimiter(per_minute=6, burst=1, max_keys=2)
+    assert limiter.try_acquire("a") == 0
+    assert limiter.try_acquire("b") == 0
+    assert limiter.try_acquire("a") > 0
+    
+    assert limiter.try_acquire("c") == 0
+    assert limiter.get_stats()["evicted"] == 1
+    assert limiter.try_acquire("a") > 0
+    assert limiter.try_acquire("b") == 0
+    
+    stats = limiter.get_stats()
+    assert stats["keys"] == 2
+    assert stats["evicted"] == 2
+    assert stats["rejected"] == 2
+
+def upload(client, ip: str, email: str):
+    return client.post(
+        "/upload",
+        files={"file": ("prompts.csv", b"Country,Prompt,Website\nUK,best crm,example.com\n")},
+        data={"email": email},
+        headers={"X-Forwarded-For": ip}
+    )
+
+def test_upload_rejected_by_ip_limit(monkeypatch):
+    import main
+    limiter = RateLimiter(per_minute=6, burst=1)
+    monkeypatch.setattr(main, "ip_rate_limiter", limiter)
+    limiter.try_acquire("10.0.0.1")
+    
+    response = upload(TestClient(main.app), "10.0.0.1", "user@example.com")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+    assert limiter.get_stats()["rejected"] == 1
+
+def test_upload_rejected_by_email_limit(monkeypatch):
+    """429 по email: временный файл загрузки удаляется, задача не создается"""
+    import main
+    limiter = RateLimiter(per_minute=2, burst=1)
+    monkeypatch.setattr(main, "ip_rate_limiter", None)
+    monkeypatch.setattr(main, "email_rate_limiter", limiter)
+    limiter.try_acquire("user@example.com")
+    before = set(os.listdir(main.UPLOAD_DIR)) if os.path.isdir(main.UPLOAD_DIR) else set()
+    
+    response = upload(TestClient(main.app), "10.0.0.2", "User@Example.com")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+    assert set(os.listdir(main.UPLOAD_DIR)) == before
@@ -0,0 +1,40 @@
+import csv
+import pytest
+from metrics import MetricsCalculator
+from report import ReportWriter, create_report_writer
+
+def row(domain: str) -> dict:
+    return MetricsCalculator.failed_metrics(domain, "UK", "")
+
+def test_report_writer_is_abstract():
+    with pytest.raises(TypeError):
+        ReportWriter("report.csv")
+
+def test_csv_rows_written_in_input_order(tmp_path):
+    path = tmp_path / "report.csv"
+    writer = create_report_writer(str(path), "csv")
+    writer.add(2, row("c.com"))
+    writer.add(0, row("a.com"))
+    assert writer.rows_written == 1
+    writer.add(1, row("b.com"))
+    writer.close()
+    
+    with open(path, encoding="utf-8") as f:
+        domains = [r["Целевой домен"] for r in csv.DictReader(f)]
+    assert domains == ["a.com", "b.com", "c.com"]
+
+def test_close_with_missing_rows_fails(tmp_path):
+    writer = create_report_writer(str(tmp_path / "report.csv"), "csv")
+    writer.add(1, row("b.com"))
+    with pytest.raises(ValueError):
+        writer.close()
+    writer.abort()
+
+def test_parquet_report(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "report.parquet"
+    writer = create_report_writer(str(path), "parquet")
+    writer.add(1, row("b.com"))
+    writer.add(0, row("a.com"))
+    writer.close()
+    assert pq.read_table(path).column("Целевой домен").to_pylist() == ["a.com", "b.com"]